@@ -0,0 +1,117 @@
+import threading
+import time
+
+QUEUE_CAPACITY = 1 << 16
+POLL_INTERVAL = 0.002   # seconds the consumer sleeps when the queue is empty
+STATUS_INTERVAL = 0.25  # seconds between status line refreshes
+
+
+class HostClock:
+    """Monotonic high-resolution host clock anchored to wall-clock time.
+
+    Callbacks stamp samples with now() (time.perf_counter_ns), which is cheap
+    and never jumps; to_epoch_ms() converts a stamp to the Unix milliseconds
+    the recordings have always used.
+    """
+
+    def __init__(self):
+        self.now = time.perf_counter_ns
+        self._anchor_ns = time.perf_counter_ns()
+        self._anchor_epoch_ns = time.time_ns()
+
+    def to_epoch_ms(self, stamp_ns):
+        return (stamp_ns - self._anchor_ns + self._anchor_epoch_ns) // 1_000_000
+
+
+class SampleQueue:
+    """Preallocated single-producer/single-consumer ring buffer.
+
+    push() and drain() never take a lock: the producer only moves the head,
+    the consumer only moves the tail, and each of those stores is atomic under
+    the GIL. When the ring is full new items are counted in self.dropped
+    instead of blocking the producer.
+    """
+
+    def __init__(self, capacity=QUEUE_CAPACITY):
+        self.capacity = capacity
+        self.dropped = 0
+        self._slots = [None] * capacity
+        self._head = 0
+        self._tail = 0
+
+    def __len__(self):
+        return self._head - self._tail
+
+    def push(self, item):
+        head = self._head
+        if head - self._tail >= self.capacity:
+            self.dropped += 1
+            return False
+        self._slots[head % self.capacity] = item
+        self._head = head + 1
+        return True
+
+    def drain(self):
+        """Remove and return every queued item, oldest first."""
+        tail, head = self._tail, self._head
+        if tail == head:
+            return []
+        slots, capacity = self._slots, self.capacity
+        start, end = tail % capacity, head % capacity
+        if start < end:
+            items = slots[start:end]
+            slots[start:end] = [None] * (end - start)
+        else:
+            items = slots[start:] + slots[:end]
+            slots[start:] = [None] * (capacity - start)
+            slots[:end] = [None] * end
+        self._tail = head
+        return items
+
+
+class QueueConsumer(threading.Thread):
+    """Thread that drains a SampleQueue and hands each batch to handler."""
+
+    def __init__(self, queue, handler, poll_interval=POLL_INTERVAL):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.handler = handler
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            items = self.queue.drain()
+            if items:
+                self.handler(items)
+            else:
+                self._stop_event.wait(self.poll_interval)
+
+    def close(self):
+        """Stop the thread and process whatever is still queued."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        items = self.queue.drain()
+        if items:
+            self.handler(items)
+
+
+class StatusReporter(threading.Thread):
+    """Refreshes a one-line status in the terminal at a fixed low rate."""
+
+    def __init__(self, status, interval=STATUS_INTERVAL):
+        super().__init__(daemon=True)
+        self.status = status
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            print(f"\r{self.status()}", end='', flush=True)
+
+    def close(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        print(f"\r{self.status()}")
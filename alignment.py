@@ -0,0 +1,114 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Multiply device_time_stamp by this to get milliseconds
+DEVICE_TIME_TO_MS = {
+    'tobii': 1e-3,     # microseconds
+    'gazepoint': 1e3,  # seconds since the Gazepoint server started
+}
+
+TRIM_MADS = 3.0  # residuals above median + TRIM_MADS * MAD are dropped from the fit
+
+
+class ClockFit(namedtuple('ClockFit', 'origin intercept slope')):
+    """Linear map from a device clock (ms) to the host clock (ms).
+
+    host = intercept + slope * (device - origin); slope - 1 is the drift of
+    the device clock relative to the host.
+    """
+
+    @property
+    def drift_ppm(self):
+        return (self.slope - 1.0) * 1e6
+
+    def to_host(self, device_ms):
+        return self.intercept + self.slope * (np.asarray(device_ms, dtype=float) - self.origin)
+
+
+def _least_squares(x, y):
+    x_mean, y_mean = x.mean(), y.mean()
+    dx = x - x_mean
+    denom = np.dot(dx, dx)
+    slope = np.dot(dx, y - y_mean) / denom if denom > 0 else 1.0
+    return y_mean - slope * x_mean, slope
+
+
+def fit_clock(device_ms, host_ms, trim_mads=TRIM_MADS, iterations=2):
+    """Offline fit of offset and linear drift between two clocks.
+
+    Host stamps are taken when a sample is received, so they include a
+    positive, occasionally large delivery latency. Samples whose residual is
+    far above the typical one are dropped and the fit is repeated.
+    """
+    device_ms = np.asarray(device_ms, dtype=float)
+    host_ms = np.asarray(host_ms, dtype=float)
+    valid = np.isfinite(device_ms) & np.isfinite(host_ms)
+    if valid.sum() < 2:
+        raise ValueError("need at least two valid samples to fit a clock")
+
+    origin = device_ms[valid][0]
+    x = device_ms[valid] - origin
+    y = host_ms[valid]
+    keep = np.ones(len(x), dtype=bool)
+    intercept, slope = _least_squares(x, y)
+    for _ in range(iterations):
+        residual = y - (intercept + slope * x)
+        median = np.median(residual[keep])
+        mad = np.median(np.abs(residual[keep] - median))
+        new_keep = residual <= median + trim_mads * max(mad, 1e-9)
+        if new_keep.sum() < 2 or (new_keep == keep).all():
+            break
+        keep = new_keep
+        intercept, slope = _least_squares(x[keep], y[keep])
+    return ClockFit(origin, intercept, slope)
+
+
+def align(frame, device, fit=None):
+    """Add an aligned_time_ms column (host clock) to a recording.
+
+    Without an explicit fit one is estimated from device_time_stamp and
+    system_time_now of the recording itself.
+    """
+    device_ms = frame['device_time_stamp'].to_numpy(dtype=float) * DEVICE_TIME_TO_MS[device]
+    if fit is None:
+        fit = fit_clock(device_ms, frame['system_time_now'].to_numpy(dtype=float))
+    return frame.assign(aligned_time_ms=fit.to_host(device_ms)), fit
+
+
+def merge_timelines(gazepoint, tobii, tolerance_ms=5.0, direction='nearest'):
+    """Single Gazepoint + Tobii timeline joined on the aligned host time.
+
+    Every Tobii sample is paired with the Gazepoint sample closest in time
+    (within tolerance_ms); columns are prefixed with the device name.
+    """
+    frames = []
+    for name, frame in (('tobii', tobii), ('gazepoint', gazepoint)):
+        aligned, _ = align(frame, name)
+        if not aligned['aligned_time_ms'].is_monotonic_increasing:
+            aligned = aligned.sort_values('aligned_time_ms', kind='stable')
+        aligned = aligned.add_prefix(f'{name}_').rename(
+            columns={f'{name}_aligned_time_ms': 'aligned_time_ms'})
+        frames.append(aligned.reset_index(drop=True))
+
+    tobii_frame, gazepoint_frame = frames
+    gazepoint_frame['gazepoint_aligned_time_ms'] = gazepoint_frame['aligned_time_ms']
+    return pd.merge_asof(tobii_frame, gazepoint_frame, on='aligned_time_ms',
+                         direction=direction, tolerance=tolerance_ms)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Merge a Gazepoint and a Tobii recording of the same session")
+    parser.add_argument('gazepoint_csv')
+    parser.add_argument('tobii_csv')
+    parser.add_argument('output_csv')
+    parser.add_argument('--tolerance-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    merged = merge_timelines(pd.read_csv(args.gazepoint_csv), pd.read_csv(args.tobii_csv),
+                             tolerance_ms=args.tolerance_ms)
+    merged.to_csv(args.output_csv, index=False)
+    print(f"✅ Saved merged timeline ({len(merged)} rows)")
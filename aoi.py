@@ -0,0 +1,234 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from heatmaps import IMAGE_HEIGHT
+
+GRID_CELL = 32  # pixels per spatial index cell
+
+STAT_COLUMNS = ['participant', 'stimulus', 'aoi', 'fixations', 'dwell_time',
+                'first_fixation_latency', 'visits', 'revisits']
+
+
+def _expand(starts, counts):
+    """Flat indices starts[i] .. starts[i] + counts[i] - 1 for every i, and their i."""
+    owner = np.repeat(np.arange(len(starts)), counts)
+    first = np.cumsum(counts) - counts
+    return np.repeat(starts, counts) + np.arange(counts.sum()) - first[owner], owner
+
+
+class AOISet:
+    """Areas of interest of one stimulus behind a uniform-grid spatial index.
+
+    aois is a list of {"name": ..., "rect": [x, y, width, height]} or
+    {"name": ..., "polygon": [[x, y], ...]} in the pixel coordinates of the
+    points given to hits(); a rect's (x, y) is its corner with the smallest
+    coordinates. Every grid cell lists the AOIs whose bounding box touches
+    it, so a point is only tested against the few AOIs of its own cell
+    instead of against all of them.
+    When AOIs overlap, the one listed first wins for primary_aoi().
+    """
+
+    def __init__(self, aois, cell_size=GRID_CELL):
+        self.names = [aoi['name'] for aoi in aois]
+        self.cell_size = cell_size
+        n = len(aois)
+        self.bounds = np.empty((n, 4))  # xmin, ymin, xmax, ymax
+        self.is_polygon = np.zeros(n, dtype=bool)
+        edges = []
+        edge_counts = np.zeros(n, dtype=np.int64)
+        for i, aoi in enumerate(aois):
+            if 'rect' in aoi:
+                x, y, width, height = aoi['rect']
+                self.bounds[i] = (x, y, x + width, y + height)
+            elif 'polygon' in aoi:
+                vertices = np.asarray(aoi['polygon'], dtype=float)
+                if len(vertices) < 3:
+                    raise ValueError(f"AOI {aoi['name']!r} needs at least 3 vertices")
+                self.bounds[i] = (*vertices.min(axis=0), *vertices.max(axis=0))
+                self.is_polygon[i] = True
+                edges.append(np.hstack([vertices, np.roll(vertices, -1, axis=0)]))
+                edge_counts[i] = len(vertices)
+            else:
+                raise ValueError(f"AOI {aoi.get('name')!r} has neither 'rect' nor 'polygon'")
+        self.edges = np.vstack(edges) if edges else np.empty((0, 4))  # x0, y0, x1, y1
+        self.edge_start = np.cumsum(edge_counts) - edge_counts
+        self.edge_count = edge_counts
+
+        # Grid over the union of the bounding boxes, as CSR: cell -> AOI indices
+        if n:
+            self.origin = self.bounds[:, :2].min(axis=0)
+            extent = self.bounds[:, 2:].max(axis=0) - self.origin
+        else:
+            self.origin = np.zeros(2)
+            extent = np.zeros(2)
+        self.shape = np.maximum(1, np.floor(extent / cell_size).astype(np.int64) + 1)  # columns, rows
+        low = self._cell_xy(self.bounds[:, :2])
+        high = self._cell_xy(self.bounds[:, 2:])
+        cells, owners = [], []
+        for i in range(n):
+            cols = np.arange(low[i, 0], high[i, 0] + 1)
+            rows = np.arange(low[i, 1], high[i, 1] + 1)
+            cells.append((rows[:, None] * self.shape[0] + cols).ravel())
+            owners.append(np.full(cells[-1].size, i))
+        cells = np.concatenate(cells) if cells else np.empty(0, dtype=np.int64)
+        owners = np.concatenate(owners) if owners else np.empty(0, dtype=np.int64)
+        order = np.lexsort((owners, cells))
+        self.cell_aois = owners[order]
+        self.cell_start = np.searchsorted(cells[order], np.arange(self.shape.prod() + 1))
+
+    def __len__(self):
+        return len(self.names)
+
+    def _cell_xy(self, points):
+        return np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+
+    def hits(self, x, y):
+        """All (point index, AOI index) pairs where a point lies inside an AOI.
+
+        Sorted by point, then AOI. Boundaries count as inside for rectangles;
+        polygons use the even-odd rule.
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        empty = np.empty(0, dtype=np.int64)
+        if not len(self) or not len(x):
+            return empty, empty
+
+        with np.errstate(invalid='ignore'):
+            cell_xy = self._cell_xy(np.column_stack([x, y]))
+        indexed = (np.isfinite(x) & np.isfinite(y) & (cell_xy >= 0).all(axis=1)
+                   & (cell_xy < self.shape).all(axis=1))
+        points = np.flatnonzero(indexed)
+        cells = cell_xy[points, 1] * self.shape[0] + cell_xy[points, 0]
+        starts = self.cell_start[cells]
+        slots, owner = _expand(starts, self.cell_start[cells + 1] - starts)
+        point = points[owner]
+        aoi = self.cell_aois[slots]
+
+        px, py = x[point], y[point]
+        bounds = self.bounds[aoi]
+        inside = (px >= bounds[:, 0]) & (px <= bounds[:, 2]) & (py >= bounds[:, 1]) & (py <= bounds[:, 3])
+        point, aoi, px, py = point[inside], aoi[inside], px[inside], py[inside]
+
+        polygon = np.flatnonzero(self.is_polygon[aoi])
+        if len(polygon):
+            edge, pair = _expand(self.edge_start[aoi[polygon]], self.edge_count[aoi[polygon]])
+            x0, y0, x1, y1 = self.edges[edge].T
+            ex, ey = px[polygon][pair], py[polygon][pair]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                crosses = ((y0 > ey) != (y1 > ey)) & (ex < (x1 - x0) * (ey - y0) / (y1 - y0) + x0)
+            odd = np.bincount(pair, weights=crosses, minlength=len(polygon)) % 2 == 1
+            keep = np.ones(len(point), dtype=bool)
+            keep[polygon] = odd
+            point, aoi = point[keep], aoi[keep]
+
+        order = np.lexsort((aoi, point))
+        return point[order], aoi[order]
+
+    def primary_aoi(self, x, y):
+        """Index of the first-listed AOI containing each point, -1 for none."""
+        return _primary(*self.hits(x, y), len(np.asarray(x)))
+
+
+def _primary(point, aoi, n):
+    # hits() is sorted by point then AOI, so the first pair of a point is its primary AOI
+    primary = np.full(n, -1, dtype=np.int64)
+    first = np.concatenate([[True], point[1:] != point[:-1]]) if len(point) else np.empty(0, dtype=bool)
+    primary[point[first]] = aoi[first]
+    return primary
+
+
+def _flip_y(aoi, height):
+    """An AOI in top-left origin pixels with y measured up from the bottom instead."""
+    aoi = dict(aoi)
+    if 'rect' in aoi:
+        x, y, width, rect_height = aoi['rect']
+        aoi['rect'] = [x, height - y - rect_height, width, rect_height]
+    elif 'polygon' in aoi:
+        aoi['polygon'] = [[x, height - y] for x, y in aoi['polygon']]
+    return aoi
+
+
+def load_aois(path, cell_size=GRID_CELL, image_height=IMAGE_HEIGHT):
+    """Read {"stimulus": [AOI, ...], ...} from JSON into an AOISet per stimulus.
+
+    The file gives AOIs in image pixels with the origin at the top-left
+    corner and y pointing down, as any image editor shows them. They are
+    flipped to the bottom-left origin of heatmaps.screen_to_image, which the
+    fixation coordinates use.
+    """
+    with open(path) as f:
+        definitions = json.load(f)
+    return {stimulus: AOISet([_flip_y(aoi, image_height) for aoi in aois], cell_size)
+            for stimulus, aois in definitions.items()}
+
+
+def aoi_statistics(fixations, aoi_sets):
+    """Dwell time, first-fixation latency, visits and transitions for every AOI.
+
+    fixations has one row per fixation with columns stimulus, start_time,
+    end_time, x and y (image pixels from heatmaps.screen_to_image, origin
+    bottom-left), optionally participant and onset_time
+    (stimulus onset; defaults to the first fixation of the participant on
+    that stimulus). A visit is a run of consecutive fixations inside the same
+    AOI; revisits = visits - 1.
+
+    Returns (stats, transitions): stats has one row per participant,
+    stimulus and fixated AOI; transitions maps each stimulus to a square
+    DataFrame counting moves from one AOI (rows) to another (columns) between
+    consecutive fixations, ignoring fixations outside every AOI.
+    """
+    fixations = fixations.copy()
+    if 'participant' not in fixations:
+        fixations['participant'] = ''
+    if 'onset_time' not in fixations:
+        fixations['onset_time'] = fixations.groupby(['participant', 'stimulus'])['start_time'].transform('min')
+    fixations = fixations.sort_values(['stimulus', 'participant', 'start_time'], kind='stable').reset_index(drop=True)
+
+    tables = []
+    transitions = {}
+    for stimulus, rows in fixations.groupby('stimulus', sort=False).indices.items():
+        aois = aoi_sets.get(stimulus)
+        if aois is None or not len(aois):
+            continue
+        subset = fixations.iloc[rows]
+        group = subset.groupby('participant', sort=False).ngroup().to_numpy()
+        participants = subset['participant'].to_numpy()
+        point, aoi = aois.hits(subset['x'].to_numpy(), subset['y'].to_numpy())
+
+        # A hit starts a new visit unless the previous fixation of the same participant hit the same AOI
+        key = point * len(aois) + aoi
+        previous = (point - 1) * len(aois) + aoi
+        position = np.minimum(np.searchsorted(key, previous), max(len(key) - 1, 0))
+        continued = (point > 0) & (group[np.maximum(point - 1, 0)] == group[point]) & (key[position] == previous)
+
+        start = subset['start_time'].to_numpy()[point]
+        pairs = pd.DataFrame({
+            'participant': participants[point],
+            'aoi': aoi,
+            'duration': subset['end_time'].to_numpy()[point] - start,
+            'latency': start - subset['onset_time'].to_numpy()[point],
+            'new_visit': ~continued,
+        })
+        stats = pairs.groupby(['participant', 'aoi'], sort=True).agg(
+            fixations=('duration', 'size'), dwell_time=('duration', 'sum'),
+            first_fixation_latency=('latency', 'min'), visits=('new_visit', 'sum')).reset_index()
+        stats['revisits'] = stats['visits'] - 1
+        stats['aoi'] = np.asarray(aois.names, dtype=object)[stats['aoi'].to_numpy()]
+        stats.insert(1, 'stimulus', stimulus)
+        tables.append(stats[STAT_COLUMNS])
+
+        # Transitions between primary AOIs of consecutive in-AOI fixations
+        primary = _primary(point, aoi, len(subset))
+        inside = primary >= 0
+        sequence, sequence_group = primary[inside], group[inside]
+        moves = (sequence_group[1:] == sequence_group[:-1]) & (sequence[1:] != sequence[:-1])
+        counts = np.bincount(sequence[:-1][moves] * len(aois) + sequence[1:][moves],
+                             minlength=len(aois) ** 2).reshape(len(aois), len(aois))
+        transitions[stimulus] = pd.DataFrame(counts, index=aois.names, columns=aois.names)
+
+    if not tables:
+        return pd.DataFrame(columns=STAT_COLUMNS), transitions
+    return pd.concat(tables, ignore_index=True), transitions
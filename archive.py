@@ -0,0 +1,567 @@
+import json
+import math
+import os
+import struct
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from session_file import LAYOUTS
+
+# Compressed archive for long recordings:
+#   MAGIC, then any number of  b'CHNK' + u32 header length + JSON header + column blobs,
+#   closed by  b'FOOT' + u32 length + JSON footer + u64 footer offset + END_MAGIC.
+# Every chunk is self-contained: its header lists each column's codec and the
+# sizes of its zlib-compressed blobs, so an archive can be written and read as
+# a stream, a file without a footer is still readable, and single chunks or
+# columns can be decoded without touching the rest.
+MAGIC = b'GZARCH01'
+END_MAGIC = b'GZAEND'
+CHUNK_TAG = b'CHNK'
+FOOTER_TAG = b'FOOT'
+EXTENSION = 'gza'
+
+CHUNK_ROWS = 65536
+PRECISION = 1e-4        # max absolute error of float columns, in column units (normalised gaze, mm pupil)
+TIME_PRECISION = 1e-6   # same for float time columns (Gazepoint TIME seconds -> 1 us)
+COMPRESS_LEVEL = 6
+
+TIME_COLUMNS = tuple(time for _, time in LAYOUTS) + ('device_time_stamp',)
+STIMULUS_COLUMNS = tuple(stimulus for stimulus, _ in LAYOUTS)
+
+_UINTS = (np.uint8, np.uint16, np.uint32, np.uint64)
+
+
+def _is_time(name):
+    return 'time' in name.lower() or name.endswith('_ns')
+
+
+def _zigzag(values):
+    """Signed integers as unsigned ones in the narrowest dtype (0, -1, 1, -2 -> 0, 1, 2, 3)."""
+    values = np.asarray(values, dtype=np.int64)
+    encoded = ((values << 1) ^ (values >> 63)).view(np.uint64)
+    top = int(encoded.max()) if len(encoded) else 0
+    dtype = next(dtype for dtype in _UINTS if top <= np.iinfo(dtype).max)
+    return encoded.astype(dtype).tobytes(), np.dtype(dtype).str
+
+
+def _unzigzag(data, dtype):
+    encoded = np.frombuffer(data, dtype).astype(np.uint64)
+    return (encoded >> 1).view(np.int64) ^ -(encoded & 1).view(np.int64)
+
+
+# Codecs: encode(values, ...) -> (parameters, [blob, ...]) with uncompressed
+# blobs; decode(entry, blobs, rows) -> values. Integer arithmetic wraps
+# around in both directions, so delta coding is exact for any int64.
+
+def _encode_delta(values, order):
+    """First value of each difference level, then zigzag residuals of order differences."""
+    values = np.asarray(values, dtype=np.int64)
+    heads = []
+    for _ in range(min(order, len(values))):
+        heads.append(int(values[0]))
+        values = np.diff(values)
+    residuals, dtype = _zigzag(values)
+    return {'heads': heads, 'residuals': dtype}, [residuals]
+
+
+def _decode_delta(entry, blobs, rows):
+    values = _unzigzag(blobs[0], entry['residuals'])
+    for head in reversed(entry['heads']):
+        values = np.cumsum(np.concatenate([np.array([head], dtype=np.int64), values]))
+    return values
+
+
+def _encode_quantised(values, step, order):
+    """Floats rounded to multiples of step and delta coded; None if they do not fit.
+
+    Missing (NaN) samples repeat the previous value, so they cost a zero
+    residual, and are restored from a bit mask.
+    """
+    finite = np.isfinite(values)
+    missing = not finite.all()
+    if missing and np.isinf(values).any():
+        return None
+    scaled = np.where(finite, values / step, 0.0)
+    if len(scaled) and np.abs(scaled).max() >= 2.0 ** 62:
+        return None
+    quantised = np.rint(scaled).astype(np.int64)
+    if missing:
+        previous = np.where(finite, np.arange(len(values)), 0)
+        quantised = quantised[np.maximum.accumulate(previous)]
+    parameters, blobs = _encode_delta(quantised, order)
+    parameters['step'] = step
+    # Rounding the decoded values keeps them tidy in CSV without leaving the bound
+    parameters['digits'] = max(0, math.ceil(-math.log10(step)) + 1)
+    if missing:
+        parameters['missing'] = True
+        blobs.append(np.packbits(~finite).tobytes())
+    return parameters, blobs
+
+
+def _decode_quantised(entry, blobs, rows):
+    values = np.round(_decode_delta(entry, blobs, rows) * entry['step'], entry['digits'])
+    if entry.get('missing'):
+        values[np.unpackbits(np.frombuffer(blobs[1], np.uint8), count=rows).view(bool)] = np.nan
+    return values
+
+
+def _encode_bits(values):
+    return {}, [np.packbits(values.astype(bool)).tobytes()]
+
+
+def _decode_bits(entry, blobs, rows):
+    return np.unpackbits(np.frombuffer(blobs[0], np.uint8), count=rows)
+
+
+def _encode_shuffle(values):
+    """Lossless: byte planes (all first bytes, all second bytes, ...) compress far better."""
+    values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder('<'))
+    return {}, [values.view(np.uint8).reshape(-1, values.itemsize).T.tobytes()]
+
+
+def _decode_shuffle(entry, blobs, rows):
+    dtype = np.dtype(entry['dtype'])
+    planes = np.frombuffer(blobs[0], np.uint8).reshape(dtype.itemsize, rows)
+    return planes.T.copy().view(dtype).ravel()
+
+
+def _encode_labels(series):
+    """Run-length encoded labels: one (code, length) pair per run."""
+    categorical = isinstance(series.dtype, pd.CategoricalDtype)
+    if categorical:
+        codes, categories = series.cat.codes.to_numpy(), series.cat.categories
+    else:
+        codes, categories = pd.factorize(series, sort=False)
+    codes = np.asarray(codes, dtype=np.int64)
+    starts = np.flatnonzero(np.concatenate([[True], codes[1:] != codes[:-1]])) if len(codes) else codes
+    run_codes, code_dtype = _zigzag(codes[starts])
+    run_lengths, length_dtype = _zigzag(np.diff(np.append(starts, len(codes))))
+    parameters = {'categories': [str(c) for c in categories], 'categorical': categorical,
+                  'codes': code_dtype, 'lengths': length_dtype}
+    return parameters, [run_codes, run_lengths]
+
+
+def _decode_labels(entry, blobs, rows):
+    codes = np.repeat(_unzigzag(blobs[0], entry['codes']), _unzigzag(blobs[1], entry['lengths']))
+    if entry['categorical']:
+        return pd.Categorical.from_codes(codes, entry['categories'])
+    # Code -1 (missing) picks the trailing None
+    return np.array(entry['categories'] + [None], dtype=object)[codes]
+
+
+def _tuple_components(series):
+    """(rows, n) floats if every value is an n-tuple or its "(x, y, ...)" text, else None.
+
+    test2.py writes display-area points and 3D positions this way.
+    """
+    if not len(series) or not (series.dtype == object or pd.api.types.is_string_dtype(series.dtype)):
+        return None
+    first = series.iloc[0]
+    try:
+        if isinstance(first, tuple):
+            components = np.array(series.tolist(), dtype=float)
+            return components if components.ndim == 2 else None
+        if isinstance(first, str) and first.startswith('('):
+            if series.str.count(',').nunique() != 1:
+                return None
+            return series.str.strip('()').str.split(',', expand=True).astype(float).to_numpy()
+    except (ValueError, TypeError, AttributeError):
+        pass
+    return None
+
+
+def _decode_tuples(entry, blobs, rows):
+    parts = []
+    for part in entry['parts']:
+        count = len(part['sizes'])
+        parts.append(_decode_quantised(part, blobs[:count], rows).tolist())
+        blobs = blobs[count:]
+    return np.fromiter(zip(*parts), dtype=object, count=rows)
+
+
+_DECODERS = {
+    'delta': _decode_delta,
+    'quantised': _decode_quantised,
+    'bits': _decode_bits,
+    'shuffle': _decode_shuffle,
+    'labels': _decode_labels,
+    'tuples': _decode_tuples,
+}
+
+
+def _decode(entry, blobs, rows):
+    values = _DECODERS[entry['codec']](entry, blobs, rows)
+    if entry['codec'] in ('labels', 'tuples'):
+        return values
+    return values.astype(np.dtype(entry['dtype']), copy=False)
+
+
+class ArchiveWriter:
+    """Streams DataFrames into a compressed archive, one chunk per chunk_rows rows.
+
+    Every column gets the codec that suits its type:
+      - integers: delta coded (delta-of-delta for time columns), zigzag
+        residuals in the narrowest integer type;
+      - floats: quantised to multiples of a step so that the decoded value is
+        within the precision bound, then delta coded like integers. Float
+        time columns use time_precision; column_precision maps a column name
+        to its own bound, and a bound of None keeps that column lossless;
+      - 0/1 columns (validity flags): one bit per sample;
+      - text and categorical columns (stimulus labels): run-length encoded;
+      - "(x, y)" tuple columns: each component quantised like a float column.
+    Blobs are then zlib-compressed. Rows are buffered until a full chunk is
+    available; flush() writes the buffered rows as a shorter chunk, close()
+    writes the remainder and the footer.
+
+    target is a path or a writable binary file object (which may be a pipe).
+    """
+
+    def __init__(self, target, precision=PRECISION, time_precision=TIME_PRECISION, column_precision=None,
+                 chunk_rows=CHUNK_ROWS, level=COMPRESS_LEVEL):
+        self._owns_file = isinstance(target, (str, os.PathLike))
+        self.file = open(target, 'wb') if self._owns_file else target
+        self.precision = precision
+        self.time_precision = time_precision
+        self.column_precision = column_precision or {}
+        self.chunk_rows = chunk_rows
+        self.level = level
+        self.rows = 0
+        self.chunks = []
+        self._pending = []
+        self._pending_rows = 0
+        self._position = len(MAGIC)  # not tell(), which pipes do not support
+        self.file.write(MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _bound(self, name):
+        if name in self.column_precision:
+            return self.column_precision[name]
+        return self.time_precision if _is_time(name) else self.precision
+
+    def _encode_float(self, name, values):
+        bound = self._bound(name)
+        if bound is not None:
+            encoded = _encode_quantised(values, float(bound), 2 if _is_time(name) else 1)
+            if encoded is not None:
+                return 'quantised', encoded
+        return 'shuffle', _encode_shuffle(values)
+
+    def _encode_column(self, name, series):
+        if isinstance(series.dtype, pd.CategoricalDtype) or not pd.api.types.is_numeric_dtype(series):
+            components = _tuple_components(series)
+            if components is None:
+                return {'codec': 'labels', 'dtype': 'object'}, *_encode_labels(series)
+            parts, blobs = [], []
+            for column in components.T:
+                codec, (parameters, part_blobs) = self._encode_float(name, column)
+                if codec != 'quantised':
+                    # Tuples are always rebuilt from quantised parts
+                    return {'codec': 'labels', 'dtype': 'object'}, *_encode_labels(series)
+                parts.append((parameters, part_blobs))
+                blobs.extend(part_blobs)
+            return {'codec': 'tuples', 'dtype': 'object'}, {'parts': parts}, blobs
+
+        values = series.to_numpy()
+        entry = {'dtype': values.dtype.str}
+        if len(values) and (values.dtype.kind == 'b' or ((values == 0) | (values == 1)).all()):
+            entry['codec'] = 'bits'
+            return entry, *_encode_bits(values)
+        if values.dtype.kind in 'iu':
+            entry['codec'] = 'delta'
+            return entry, *_encode_delta(values, 2 if _is_time(name) else 1)
+        if values.dtype.kind == 'f':
+            entry['codec'], (parameters, blobs) = self._encode_float(name, values.astype(float))
+            return entry, parameters, blobs
+        entry['codec'] = 'shuffle'
+        return entry, *_encode_shuffle(values)
+
+    def _compress(self, blobs):
+        return [zlib.compress(blob, self.level) for blob in blobs]
+
+    def _write_chunk(self, frame):
+        columns, payload = [], []
+        for name in frame.columns:
+            entry, parameters, blobs = self._encode_column(name, frame[name])
+            entry = {'name': name, **entry}
+            blobs = self._compress(blobs)
+            entry['sizes'] = [len(blob) for blob in blobs]
+            if entry['codec'] == 'tuples':
+                entry['parts'] = []
+                sizes = entry['sizes']
+                for part, part_blobs in parameters['parts']:
+                    part['sizes'], sizes = sizes[:len(part_blobs)], sizes[len(part_blobs):]
+                    entry['parts'].append(part)
+            else:
+                entry.update(parameters)
+            columns.append(entry)
+            payload.extend(blobs)
+
+        summary = {'start': self.rows, 'rows': len(frame)}
+        time_column = next((name for name in TIME_COLUMNS if name in frame), None)
+        if time_column and len(frame) and pd.api.types.is_numeric_dtype(frame[time_column]):
+            times = frame[time_column].to_numpy(dtype=float)
+            if np.isfinite(times).any():
+                summary['t_start'] = float(np.nanmin(times))
+                summary['t_end'] = float(np.nanmax(times))
+        stimulus_column = next((name for name in STIMULUS_COLUMNS if name in frame), None)
+        if stimulus_column:
+            summary['stimuli'] = [str(s) for s in pd.unique(frame[stimulus_column].astype(str))]
+
+        header = json.dumps({**summary, 'columns': columns}).encode()
+        self.file.write(CHUNK_TAG + struct.pack('<I', len(header)) + header)
+        for blob in payload:
+            self.file.write(blob)
+        self.file.flush()
+        self.chunks.append({'offset': self._position, **summary})
+        self._position += 8 + len(header) + sum(map(len, payload))
+        self.rows += len(frame)
+
+    def write(self, frame):
+        if not len(frame):
+            return
+        self._pending.append(frame)
+        self._pending_rows += len(frame)
+        if self._pending_rows < self.chunk_rows:
+            return
+        frame = pd.concat(self._pending, ignore_index=True) if len(self._pending) > 1 else self._pending[0]
+        full = len(frame) - len(frame) % self.chunk_rows
+        for start in range(0, full, self.chunk_rows):
+            self._write_chunk(frame.iloc[start:start + self.chunk_rows])
+        self._pending = [frame.iloc[full:]] if full < len(frame) else []
+        self._pending_rows = len(frame) - full
+
+    def flush(self):
+        if self._pending:
+            self._write_chunk(pd.concat(self._pending, ignore_index=True))
+            self._pending = []
+            self._pending_rows = 0
+
+    def close(self):
+        self.flush()
+        footer = json.dumps({'rows': self.rows, 'chunks': self.chunks}).encode()
+        self.file.write(FOOTER_TAG + struct.pack('<I', len(footer)) + footer)
+        self.file.write(struct.pack('<Q', self._position) + END_MAGIC)
+        if self._owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+def _read_exact(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise EOFError
+    return data
+
+
+def _read_chunk(stream, columns=None):
+    """Decode the chunk at the stream position; None at the footer or a cut-off end.
+
+    Unselected columns are skipped without decompressing them.
+    """
+    try:
+        tag = _read_exact(stream, 4)
+        if tag != CHUNK_TAG:
+            return None
+        (length,) = struct.unpack('<I', _read_exact(stream, 4))
+        header = json.loads(_read_exact(stream, length))
+        data = {}
+        for entry in header['columns']:
+            if columns is not None and entry['name'] not in columns:
+                _read_exact(stream, sum(entry['sizes']))
+                continue
+            blobs = [zlib.decompress(_read_exact(stream, size)) for size in entry['sizes']]
+            data[entry['name']] = _decode(entry, blobs, header['rows'])
+    except (EOFError, zlib.error):
+        return None  # chunk cut short by a crash
+    return data
+
+
+def iter_chunks(stream, columns=None):
+    """Decode an archive chunk by chunk from a binary stream, as DataFrames.
+
+    Only reads forward, so it works on pipes and network streams.
+    """
+    if stream.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not an archive")
+    while True:
+        data = _read_chunk(stream, columns)
+        if data is None:
+            return
+        yield pd.DataFrame(data, copy=False)
+
+
+def _concat(parts):
+    if isinstance(parts[0], pd.Categorical):
+        return pd.api.types.union_categoricals(parts)
+    return np.concatenate(parts)
+
+
+class ArchiveReader:
+    """Random access to the chunks of an archive file.
+
+    The chunk index (row range, time range and stimuli of every chunk) comes
+    from the footer, or from the chunk headers when the footer is missing.
+    Reads decompress only the chunks and columns they need.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not an archive")
+            self.chunks = self._footer(f)
+            if self.chunks is None:
+                self.chunks = self._scan(f)
+        self.rows = sum(chunk['rows'] for chunk in self.chunks)
+
+    @staticmethod
+    def _footer(f):
+        end = f.seek(0, os.SEEK_END)
+        if end < len(MAGIC) + 8 + len(END_MAGIC):
+            return None
+        f.seek(end - 8 - len(END_MAGIC))
+        (offset,) = struct.unpack('<Q', f.read(8))
+        if f.read() != END_MAGIC:
+            return None
+        f.seek(offset)
+        if f.read(4) != FOOTER_TAG:
+            return None
+        (length,) = struct.unpack('<I', f.read(4))
+        return json.loads(f.read(length))['chunks']
+
+    @staticmethod
+    def _scan(f):
+        size = f.seek(0, os.SEEK_END)
+        chunks = []
+        position = len(MAGIC)
+        f.seek(position)
+        while f.read(4) == CHUNK_TAG:
+            (length,) = struct.unpack('<I', f.read(4))
+            header = f.read(length)
+            if len(header) < length:
+                break
+            header = json.loads(header)
+            end = position + 8 + length + sum(sum(entry['sizes']) for entry in header['columns'])
+            if end > size:
+                break
+            chunks.append({'offset': position, **{k: v for k, v in header.items() if k != 'columns'}})
+            position = f.seek(end)
+        return chunks
+
+    @property
+    def stimuli(self):
+        return list(dict.fromkeys(s for chunk in self.chunks for s in chunk.get('stimuli', [])))
+
+    @property
+    def columns(self):
+        if not self.chunks:
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(self.chunks[0]['offset'] + 4)
+            (length,) = struct.unpack('<I', f.read(4))
+            return [entry['name'] for entry in json.loads(f.read(length))['columns']]
+
+    def read_chunk(self, i, columns=None):
+        with open(self.path, 'rb') as f:
+            f.seek(self.chunks[i]['offset'])
+            return pd.DataFrame(_read_chunk(f, columns), copy=False)
+
+    def frame(self, columns=None, chunks=None):
+        """The selected chunks (default: all) as one DataFrame."""
+        chunks = range(len(self.chunks)) if chunks is None else chunks
+        parts = {}
+        with open(self.path, 'rb') as f:
+            for i in chunks:
+                f.seek(self.chunks[i]['offset'])
+                for name, values in _read_chunk(f, columns).items():
+                    parts.setdefault(name, []).append(values)
+        return pd.DataFrame({name: _concat(values) for name, values in parts.items()}, copy=False)
+
+    def time_frame(self, t_start, t_end, time_column, columns=None):
+        """Rows with t_start <= time_column <= t_end, reading only the chunks that overlap."""
+        chunks = [i for i, chunk in enumerate(self.chunks)
+                  if 't_start' not in chunk or (chunk['t_start'] <= t_end and chunk['t_end'] >= t_start)]
+        wanted = None if columns is None else list(dict.fromkeys([*columns, time_column]))
+        frame = self.frame(wanted, chunks)
+        frame = frame[frame[time_column].between(t_start, t_end)].reset_index(drop=True)
+        return frame if columns is None else frame[list(columns)]
+
+    def stimulus_frame(self, stimulus, stimulus_column='stimulus', columns=None):
+        """Samples recorded while stimulus was shown, reading only the chunks that contain it."""
+        chunks = [i for i, chunk in enumerate(self.chunks) if stimulus in chunk.get('stimuli', [stimulus])]
+        wanted = None if columns is None else list(dict.fromkeys([*columns, stimulus_column]))
+        frame = self.frame(wanted, chunks)
+        frame = frame[frame[stimulus_column].astype(str) == stimulus].reset_index(drop=True)
+        return frame if columns is None else frame[list(columns)]
+
+    def to_csv(self, path):
+        header = True
+        with open(path, 'w', newline='') as f:
+            for i in range(len(self.chunks)):
+                self.read_chunk(i).to_csv(f, index=False, header=header)
+                header = False
+
+
+def read_archive(path, columns=None):
+    return ArchiveReader(path).frame(columns)
+
+
+def _source_frames(path, chunk_rows):
+    if path.endswith('.gzc'):
+        from recording_writer import read_binary
+        yield read_binary(path)
+    elif path.endswith('.gzs'):
+        from session_file import SessionFile
+        yield SessionFile(path).frame()
+    elif path.endswith('.parquet'):
+        yield pd.read_parquet(path)
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+
+
+def convert(source, target=None, chunk_rows=CHUNK_ROWS, **options):
+    """Archive a CSV, binary, session or parquet recording next to it; returns the target path.
+
+    CSV files are read chunk by chunk, so memory does not grow with the
+    recording. options are passed to ArchiveWriter.
+    """
+    if target is None:
+        target = f"{source.rsplit('.', 1)[0]}.{EXTENSION}"
+    with ArchiveWriter(target, chunk_rows=chunk_rows, **options) as writer:
+        for frame in _source_frames(source, chunk_rows):
+            writer.write(frame)
+    return target
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compress recordings into archives, or expand an archive to CSV")
+    parser.add_argument('source')
+    parser.add_argument('target', nargs='?')
+    parser.add_argument('--precision', type=float, default=PRECISION,
+                        help=f"max absolute error of float columns (default {PRECISION})")
+    parser.add_argument('--time-precision', type=float, default=TIME_PRECISION,
+                        help=f"max absolute error of float time columns (default {TIME_PRECISION})")
+    parser.add_argument('--lossless', action='store_true', help="keep every float column exact")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    if args.source.endswith(f'.{EXTENSION}'):
+        target = args.target or f"{args.source.rsplit('.', 1)[0]}.csv"
+        ArchiveReader(args.source).to_csv(target)
+        print(f"✅ Saved {target}")
+    else:
+        target = convert(args.source, args.target, args.chunk_rows,
+                         precision=None if args.lossless else args.precision,
+                         time_precision=None if args.lossless else args.time_precision)
+        ratio = os.path.getsize(args.source) / max(os.path.getsize(target), 1)
+        print(f"✅ Saved {target} ({ratio:.1f}x smaller)")
@@ -0,0 +1,329 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from fixations import classify_idt, fixation_table, window_size_from_ms
+from heatmaps import SIGMA_DEG, fixation_density, screen_to_image
+from saccades import LAMBDA, detect_saccades
+
+# File patterns written by gp_tb.py, more_stimuli.py and test2.py
+SESSION_PATTERNS = (
+    'gazepoint_data_*.csv', 'gazepoint_data_*.gzc', 'gazepoint_data_*.parquet', 'gazepoint_data_*.gzs',
+    'gazepoint_data_*.gza',
+    'tobii_data_*.csv', 'tobii_data_*.gzc', 'tobii_data_*.parquet', 'tobii_data_*.gzs', 'tobii_data_*.gza',
+    'gaze_data*.csv', 'gaze_data*.gzs', 'gaze_data*.gza',
+    'eye_tracking_final*.csv', 'eye_tracking_final*.gza',
+)
+
+# I-DT parameters. The window is a duration so fixations mean the same on every
+# device; sessions without timestamps fall back to more_stimuli.py's 40 samples.
+WINDOW_MS = 100.0
+WINDOW_SIZE = 40
+DISPERSION_THRESHOLD = 0.05
+
+MEMORY_PER_BYTE = 12     # rough peak memory per byte of CSV input while analysing
+MEMORY_BUDGET_GB = 4.0
+
+STANDARD_COLUMNS = ['left_x', 'left_y', 'right_x', 'right_y', 'left_validity', 'right_validity', 'stimulus', 'time']
+
+# device_time_stamp units: Tobii SDK microseconds, Gazepoint TIME seconds
+GAZEPOINT_PREFIX = 'gazepoint_'
+TOBII_TIME_TO_S = 1e-6
+
+
+def discover_sessions(roots):
+    """All recording files below the given directories, sorted by path."""
+    found = set()
+    for root in roots:
+        for pattern in SESSION_PATTERNS:
+            found.update(glob.glob(os.path.join(root, '**', pattern), recursive=True))
+    return sorted(os.path.abspath(path) for path in found)
+
+
+def _split_point(column):
+    # test2.py writes display-area points as "(x, y)" strings
+    parts = column.astype(str).str.strip('()').str.split(',', n=1, expand=True)
+    return pd.to_numeric(parts[0], errors='coerce'), pd.to_numeric(parts[1], errors='coerce')
+
+
+def load_session(path):
+    """Read any known recording layout into STANDARD_COLUMNS."""
+    if path.endswith('.gzc'):
+        from recording_writer import read_binary
+        raw = read_binary(path)
+    elif path.endswith('.gzs'):
+        from session_file import SessionFile
+        raw = SessionFile(path).frame()
+    elif path.endswith('.gza'):
+        from archive import read_archive
+        raw = read_archive(path)
+    elif path.endswith('.parquet'):
+        raw = pd.read_parquet(path)
+    else:
+        raw = pd.read_csv(path)
+
+    if 'left_gaze_x' in raw:  # gp_tb.py
+        frame = pd.DataFrame({
+            'left_x': raw['left_gaze_x'], 'left_y': raw['left_gaze_y'],
+            'right_x': raw['right_gaze_x'], 'right_y': raw['right_gaze_y'],
+            'left_validity': raw['left_validity'], 'right_validity': raw['right_validity'],
+            'stimulus': raw['stimulus'].astype(str),
+            'time': raw['device_time_stamp'] * (1.0 if os.path.basename(path).startswith(GAZEPOINT_PREFIX)
+                                                else TOBII_TIME_TO_S),
+        })
+    elif 'Left Gaze X' in raw:  # more_stimuli.py
+        frame = pd.DataFrame({
+            'left_x': raw['Left Gaze X'], 'left_y': raw['Left Gaze Y'],
+            'right_x': raw['Right Gaze X'], 'right_y': raw['Right Gaze Y'],
+            'left_validity': raw['Left Gaze Validity'], 'right_validity': raw['Right Gaze Validity'],
+            'stimulus': raw['Event Flag'].astype(str),
+            # Its Timestamp column restarts with every sample, so there is no usable time
+            'time': np.nan,
+        })
+    elif 'left_gaze_point_on_display_area' in raw:  # test2.py
+        left_x, left_y = _split_point(raw['left_gaze_point_on_display_area'])
+        right_x, right_y = _split_point(raw['right_gaze_point_on_display_area'])
+        frame = pd.DataFrame({
+            'left_x': left_x, 'left_y': left_y, 'right_x': right_x, 'right_y': right_y,
+            'left_validity': raw['left_gaze_point_validity'],
+            'right_validity': raw['right_gaze_point_validity'],
+            'stimulus': 'none',
+            'time': raw['device_time_stamp'] * TOBII_TIME_TO_S,
+        })
+    else:
+        raise ValueError(f"unknown recording layout in {path}")
+    return frame
+
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return {'source': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _params():
+    return {'window_ms': WINDOW_MS, 'window_size': WINDOW_SIZE, 'dispersion_threshold': DISPERSION_THRESHOLD,
+            'sigma_deg': SIGMA_DEG, 'saccade_lambda': LAMBDA}
+
+
+def idt_window_size(frame):
+    """I-DT window in samples: WINDOW_MS at the session's own rate, else WINDOW_SIZE."""
+    try:
+        return window_size_from_ms(WINDOW_MS, timestamps=frame['time'].dropna())
+    except ValueError:
+        return WINDOW_SIZE
+
+
+def session_output_dir(path, output_root):
+    # Participants' files often share a name, so the full path is part of the key
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:10]
+    return os.path.join(output_root, f"{os.path.splitext(os.path.basename(path))[0]}_{digest}")
+
+
+def is_up_to_date(path, output_root):
+    summary_path = os.path.join(session_output_dir(path, output_root), 'summary.json')
+    try:
+        with open(summary_path) as f:
+            summary = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return summary.get('stamp') == _source_stamp(path) and summary.get('params') == _params()
+
+
+def analyse_session(path, output_root):
+    """Per-session pipeline of more_stimuli.py: average, I-DT, image densities.
+
+    Sessions with device timestamps also get a saccade table (saccades.csv)
+    and a fixation table in image pixels (fixations.csv) for AOI statistics.
+    """
+    out_dir = session_output_dir(path, output_root)
+    os.makedirs(out_dir, exist_ok=True)
+    frame = load_session(path)
+
+    x_avg = ((frame['left_x'] + frame['right_x']) / 2).to_numpy()
+    y_avg = ((frame['left_y'] + frame['right_y']) / 2).to_numpy()
+    window_size = idt_window_size(frame)
+    frame['Movement'] = classify_idt(x_avg, y_avg, DISPERSION_THRESHOLD, window_size=window_size)
+    frame.to_csv(os.path.join(out_dir, 'classified.csv'), index=False)
+
+    usable = ((frame['Movement'] == 'fixation') & (frame['left_validity'] == 1)
+              & (frame['right_validity'] == 1)
+              & frame[['left_x', 'left_y', 'right_x', 'right_y']].notna().all(axis=1)).to_numpy()
+
+    saccades = None
+    if frame['time'].notna().any():
+        left_valid = (frame['left_validity'] == 1).to_numpy()
+        right_valid = (frame['right_validity'] == 1).to_numpy()
+        saccades = detect_saccades(
+            frame['time'].to_numpy(dtype=float),
+            np.where(left_valid, frame['left_x'], np.nan), np.where(left_valid, frame['left_y'], np.nan),
+            np.where(right_valid, frame['right_x'], np.nan), np.where(right_valid, frame['right_y'], np.nan),
+            segments=frame['stimulus'].to_numpy())
+        saccades.to_csv(os.path.join(out_dir, 'saccades.csv'), index=False)
+
+        image_x, image_y = screen_to_image(x_avg, y_avg)
+        fixations = fixation_table(image_x, image_y, frame['time'], frame['Movement'],
+                                   segments=frame['stimulus'])
+        fixations['stimulus'] = frame['stimulus'].to_numpy()[fixations['start']]
+        fixations['onset_time'] = frame.groupby('stimulus')['time'].transform('min').to_numpy()[fixations['start']]
+        fixations.to_csv(os.path.join(out_dir, 'fixations.csv'), index=False)
+
+    stimuli = {}
+    codes, names = pd.factorize(frame['stimulus'])
+    for code, stimulus in enumerate(names):
+        in_stimulus = codes == code
+        selected = frame[in_stimulus & usable]
+        left_x, left_y = screen_to_image(selected['left_x'], selected['left_y'])
+        right_x, right_y = screen_to_image(selected['right_x'], selected['right_y'])
+        density = fixation_density(np.concatenate([left_x, right_x]), np.concatenate([left_y, right_y]))
+        density_file = f'density_{len(stimuli)}.npy'
+        np.save(os.path.join(out_dir, density_file), density)
+        stimuli[stimulus] = {
+            'samples': int(in_stimulus.sum()),
+            'fixation_samples': int((in_stimulus & usable).sum()),
+            'density': density_file,
+        }
+        if saccades is not None:
+            stimuli[stimulus]['saccades'] = int((saccades['segment'] == stimulus).sum())
+
+    summary = {'stamp': _source_stamp(path), 'params': _params(),
+               'samples': len(frame), 'window_size': window_size, 'stimuli': stimuli}
+    with open(os.path.join(out_dir, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return path
+
+
+def run_batch(paths, output_root, memory_budget_gb=MEMORY_BUDGET_GB, workers=None, force=False):
+    """Analyse sessions in a process pool without exceeding the memory budget.
+
+    Each session's peak memory is estimated from its file size; a session is
+    only started when the running estimates plus its own fit in the budget
+    (a session bigger than the whole budget runs alone).
+    """
+    pending = [path for path in paths if force or not is_up_to_date(path, output_root)]
+    skipped = len(paths) - len(pending)
+    budget = memory_budget_gb * 2**30
+    estimate = {path: os.path.getsize(path) * MEMORY_PER_BYTE for path in pending}
+    pending.sort(key=estimate.get, reverse=True)
+
+    failed = {}
+    running = {}
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            in_use = sum(estimate[path] for path in running.values())
+            for path in list(pending):
+                if len(running) >= workers:
+                    break
+                if running and in_use + estimate[path] > budget:
+                    continue
+                running[pool.submit(analyse_session, path, output_root)] = path
+                in_use += estimate[path]
+                pending.remove(path)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = running.pop(future)
+                try:
+                    future.result()
+                    print(f"✅ {os.path.basename(path)}")
+                except Exception as e:
+                    failed[path] = str(e)
+                    print(f"❌ {os.path.basename(path)}: {e}")
+    return skipped, failed
+
+
+def aggregate(paths, output_root):
+    """Combine per-session summaries into one table and mean densities per stimulus."""
+    rows = []
+    density_sums = {}
+    density_counts = {}
+    for path in paths:
+        out_dir = session_output_dir(path, output_root)
+        try:
+            with open(os.path.join(out_dir, 'summary.json')) as f:
+                summary = json.load(f)
+        except OSError:
+            continue
+        for stimulus, info in summary['stimuli'].items():
+            rows.append({'session': path, 'stimulus': stimulus,
+                         'samples': info['samples'], 'fixation_samples': info['fixation_samples']})
+            if info['fixation_samples']:
+                density = np.load(os.path.join(out_dir, info['density']))
+                if stimulus in density_sums:
+                    density_sums[stimulus] += density
+                else:
+                    density_sums[stimulus] = density
+                density_counts[stimulus] = density_counts.get(stimulus, 0) + 1
+
+    table = pd.DataFrame(rows, columns=['session', 'stimulus', 'samples', 'fixation_samples'])
+    table.to_csv(os.path.join(output_root, 'aggregate.csv'), index=False)
+    means = {stimulus: density_sums[stimulus] / density_counts[stimulus] for stimulus in density_sums}
+    for i, (stimulus, density) in enumerate(sorted(means.items())):
+        np.save(os.path.join(output_root, f'aggregate_density_{i}.npy'), density)
+    with open(os.path.join(output_root, 'aggregate_density_index.json'), 'w') as f:
+        json.dump({stimulus: f'aggregate_density_{i}.npy' for i, stimulus in enumerate(sorted(means))}, f, indent=2)
+    return table, means
+
+
+def aoi_report(paths, output_root, aoi_path):
+    """AOI statistics over the fixation tables of all sessions, one participant per session."""
+    from aoi import aoi_statistics, load_aois
+
+    tables = []
+    for path in paths:
+        fixations_path = os.path.join(session_output_dir(path, output_root), 'fixations.csv')
+        if os.path.exists(fixations_path):
+            tables.append(pd.read_csv(fixations_path).assign(participant=path))
+    if not tables:
+        return None, {}
+    stats, transitions = aoi_statistics(pd.concat(tables, ignore_index=True), load_aois(aoi_path))
+    stats.to_csv(os.path.join(output_root, 'aoi_statistics.csv'), index=False)
+    for i, (stimulus, matrix) in enumerate(sorted(transitions.items())):
+        matrix.to_csv(os.path.join(output_root, f'aoi_transitions_{i}.csv'))
+    with open(os.path.join(output_root, 'aoi_transitions_index.json'), 'w') as f:
+        json.dump({stimulus: f'aoi_transitions_{i}.csv' for i, stimulus in enumerate(sorted(transitions))}, f, indent=2)
+    return stats, transitions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse many recorded sessions in parallel")
+    parser.add_argument('roots', nargs='+', help="directories to search for recordings")
+    parser.add_argument('--output', default='analysis', help="output directory")
+    parser.add_argument('--memory-gb', type=float, default=MEMORY_BUDGET_GB)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--force', action='store_true', help="re-analyse sessions that are up to date")
+    parser.add_argument('--images', help="directory with stimulus images; renders aggregate heatmaps")
+    parser.add_argument('--aois', help="JSON file with the AOIs of every stimulus; writes AOI statistics")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    paths = discover_sessions(args.roots)
+    print(f"Found {len(paths)} sessions")
+    skipped, failed = run_batch(paths, args.output, args.memory_gb, args.workers, args.force)
+    print(f"Skipped {skipped} up-to-date sessions, {len(failed)} failed")
+
+    table, means = aggregate(paths, args.output)
+    print(f"✅ Aggregated {table['session'].nunique()} sessions, {len(means)} stimuli")
+
+    if args.aois:
+        stats, transitions = aoi_report(paths, args.output, args.aois)
+        if stats is None:
+            print("No fixation tables for AOI statistics (sessions need device timestamps)")
+        else:
+            print(f"✅ AOI statistics: {len(stats)} rows, {len(transitions)} transition matrices")
+
+    if args.images:
+        from heatmaps import render_heatmaps
+        items = [(stimulus, os.path.join(args.images, stimulus), density)
+                 for stimulus, density in sorted(means.items())
+                 if os.path.exists(os.path.join(args.images, stimulus))]
+        render_heatmaps(items, os.path.join(args.output, 'aggregate_heatmap_{name}.png'))
+
+
+if __name__ == "__main__":
+    main()
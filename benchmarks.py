@@ -0,0 +1,357 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+BATCH_SIZE = 100_000
+RESULTS_DIR = 'benchmark_results'
+REGRESSION_RATIO = 1.2  # throughput drops beyond this factor are flagged
+
+
+class SkipStage(Exception):
+    pass
+
+
+def synthetic_gaze(n, rng, rate_hz=600):
+    """Normalised binocular gaze: fixations with noise, separated by saccades."""
+    starts = np.flatnonzero(rng.random(n) < 4.0 / rate_hz)
+    targets = rng.uniform(0.1, 0.9, size=(len(starts) + 1, 2))
+    segment = np.searchsorted(starts, np.arange(n), side='right')
+    gaze = targets[segment] + rng.normal(0, 0.003, size=(n, 2))
+    right = gaze + rng.normal(0, 0.002, size=(n, 2))
+    return gaze[:, 0], gaze[:, 1], right[:, 0], right[:, 1]
+
+
+def _gazepoint_bytes(n, rng):
+    lx, ly, rx, ry = synthetic_gaze(n, rng, rate_hz=150)
+    pupil = rng.uniform(0.003, 0.0042, size=n)
+    return ''.join(
+        f'<REC TIME="{i / 150:.5f}" FPOGX="{a:.5f}" FPOGY="{b:.5f}" FPOGV="1" '
+        f'LPOGX="{a:.5f}" LPOGY="{b:.5f}" LPOGV="1" RPOGX="{c:.5f}" RPOGY="{d:.5f}" RPOGV="1" '
+        f'LPUPILD="{p:.5f}" LPUPILDV="1" RPUPILD="{p:.5f}" RPUPILDV="1" />\r\n'
+        for i, (a, b, c, d, p) in enumerate(zip(lx, ly, rx, ry, pupil))
+    ).encode()
+
+
+def _tobii_dicts(n, rng):
+    lx, ly, rx, ry = synthetic_gaze(n, rng)
+    pupil = rng.uniform(3.0, 4.2, size=n)
+    return [{
+        'device_time_stamp': i * 1667,
+        'system_time_stamp': 10_000_000 + i * 1667,
+        'system_time_now': 1_700_000_000_000 + i * 1.667,
+        'left_gaze_point_on_display_area': (a, b),
+        'left_gaze_point_validity': 1,
+        'left_pupil_diameter': p,
+        'left_pupil_validity': 1,
+        'right_gaze_point_on_display_area': (c, d),
+        'right_gaze_point_validity': 1,
+        'right_pupil_diameter': p,
+        'right_pupil_validity': 1,
+    } for i, (a, b, c, d, p) in enumerate(zip(lx.tolist(), ly.tolist(), rx.tolist(), ry.tolist(), pupil.tolist()))]
+
+
+# Each stage: make(n, rng) -> input for one batch of n samples, run(input) -> None
+
+def _parse_gazepoint(data):
+    from gazepoint_stream import GazepointStream
+    stream = GazepointStream()
+    view = memoryview(data)
+    for pos in range(0, len(data), 65536):
+        stream.feed(view[pos:pos + 65536])
+
+
+def _parse_gazepoint_legacy(data):
+    # The ElementTree parse gazepoint_collection used before GazepointStream
+    import xml.etree.ElementTree as ET
+    for line in data.decode().strip().split('\r\n'):
+        if line.startswith('<REC'):
+            root = ET.fromstring(line)
+            [float(root.get(k, 0)) for k in ('TIME', 'LPOGX', 'LPOGY', 'LPUPILD', 'LPOGV',
+                                              'RPOGX', 'RPOGY', 'RPUPILD', 'RPOGV')]
+
+
+def _convert_tobii(samples):
+    # What the SDK callback does per sample in gp_tb.py
+    from tobii_convert import gaze_sample
+    [gaze_sample(d) for d in samples]
+
+
+def _convert_tobii_legacy(samples):
+    # The per-sample dicts of process_tobii_data and the DataFrame gp_tb.py built from them
+    import pandas as pd
+    pd.DataFrame([{
+        'system_time_now': data['system_time_now'],
+        'device_time_stamp': data.get('device_time_stamp', 0),
+        'left_gaze_x': data.get('left_gaze_point_on_display_area', [0, 0])[0],
+        'left_gaze_y': data.get('left_gaze_point_on_display_area', [0, 0])[1],
+        'left_pupil': data.get('left_pupil_diameter', 0),
+        'left_validity': data.get('left_gaze_point_validity', 0),
+        'right_gaze_x': data.get('right_gaze_point_on_display_area', [0, 0])[0],
+        'right_gaze_y': data.get('right_gaze_point_on_display_area', [0, 0])[1],
+        'right_pupil': data.get('right_pupil_diameter', 0),
+        'right_validity': data.get('right_gaze_point_validity', 0),
+        'stimulus': data.get('stimulus', 'none')
+    } for data in samples])
+
+
+def _make_idt(n, rng):
+    lx, ly, rx, ry = synthetic_gaze(n, rng)
+    return (lx + rx) / 2, (ly + ry) / 2
+
+
+def _run_idt(data):
+    from fixations import classify_idt
+    classify_idt(data[0], data[1], 0.05, window_size=40)
+
+
+def _make_heatmap(n, rng):
+    x, y = _make_idt(n, rng)
+    return x * 800, y * 600
+
+
+def _run_heatmap_kde(data):
+    # The exact KDE more_stimuli.py draws for every stimulus
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+    except ImportError as e:
+        raise SkipStage(f"seaborn/matplotlib not installed ({e})")
+    fig = plt.figure(figsize=(8, 6))
+    sns.kdeplot(x=data[0], y=data[1], cmap="Reds", fill=True, alpha=0.6)
+    plt.close(fig)
+
+
+def _run_heatmap_binned(data):
+    from heatmaps import fixation_density
+    fixation_density(data[0], data[1])
+
+
+def _make_openness(n, rng):
+    samples = _tobii_dicts(n, rng)
+    for d in samples:
+        d['left_eye'] = {'openness': 10.0, 'validity': 1}
+        d['right_eye'] = {'openness': 10.5, 'validity': 1}
+    fieldnames = []
+    for key, value in samples[0].items():
+        if isinstance(value, dict):
+            fieldnames += [f"{key}.{sub}" for sub in value]
+        else:
+            fieldnames.append(key)
+    return samples, fieldnames
+
+
+def _flatten_test2(data):
+    # The per-cell row building of test2.py's CSV writer
+    import csv
+    import io
+    samples, fieldnames = data
+    writer = csv.writer(io.StringIO())
+    for data_point in samples:
+        row = []
+        for field in fieldnames:
+            if '.' in field:
+                main_key, sub_key = field.split('.')
+                row.append(data_point[main_key][sub_key])
+            else:
+                row.append(data_point[field])
+        writer.writerow(row)
+
+
+def _export_columns(data):
+    from tobii_export import join_openness, to_columns
+    samples, _ = data
+    openness = [{'device_time_stamp': d['device_time_stamp'], 'left_eye_openness_value': 10.0,
+                 'right_eye_openness_value': 10.5} for d in samples]
+    join_openness(to_columns(samples), to_columns(openness))
+
+
+def _make_store_rows(n, rng):
+    lx, ly, rx, ry = synthetic_gaze(n, rng)
+    return [(i, i, i * 1667, a, b, 3.5, 1, c, d, 3.4, 1)
+            for i, (a, b, c, d) in enumerate(zip(lx.tolist(), ly.tolist(), rx.tolist(), ry.tolist()))]
+
+
+def _append_store(rows):
+    from sample_store import SampleStore, TOBII_SCHEMA
+    store = SampleStore(TOBII_SCHEMA)
+    append = store.append
+    for row in rows:
+        append(row, 'none')
+    store.frame()
+
+
+def _make_recording(n, rng):
+    import pandas as pd
+    lx, ly, rx, ry = synthetic_gaze(n, rng)
+    return pd.DataFrame({
+        'system_time_now': 1_700_000_000_000 + np.arange(n) * 5 // 3,
+        'device_time_stamp': np.arange(n) * 1667 + rng.integers(-2, 3, size=n),
+        'left_gaze_x': lx, 'left_gaze_y': ly, 'left_pupil': rng.normal(3.5, 0.05, size=n), 'left_validity': 1,
+        'right_gaze_x': rx, 'right_gaze_y': ry, 'right_pupil': rng.normal(3.4, 0.05, size=n), 'right_validity': 1,
+        'stimulus': pd.Categorical(np.repeat(['none', 'face.jpg', 'beach.jpg'], -(-n // 3))[:n]),
+    })
+
+
+def _encode_archive(frame):
+    import io
+    from archive import ArchiveWriter
+    with ArchiveWriter(io.BytesIO()) as writer:
+        writer.write(frame)
+
+
+def _make_archive(n, rng):
+    import io
+    from archive import ArchiveWriter
+    data = io.BytesIO()
+    with ArchiveWriter(data) as writer:
+        writer.write(_make_recording(n, rng))
+    return data.getvalue()
+
+
+def _decode_archive(data):
+    import io
+    from archive import iter_chunks
+    for _ in iter_chunks(io.BytesIO(data)):
+        pass
+
+
+STAGES = {
+    'gazepoint_parse': (_gazepoint_bytes, _parse_gazepoint),
+    'gazepoint_parse_legacy': (_gazepoint_bytes, _parse_gazepoint_legacy),
+    'tobii_convert': (_tobii_dicts, _convert_tobii),
+    'tobii_convert_legacy': (_tobii_dicts, _convert_tobii_legacy),
+    'sample_store_append': (_make_store_rows, _append_store),
+    'idt_classify': (_make_idt, _run_idt),
+    'heatmap_kde': (_make_heatmap, _run_heatmap_kde),
+    'heatmap_binned': (_make_heatmap, _run_heatmap_binned),
+    'test2_flatten': (_make_openness, _flatten_test2),
+    'tobii_export_columns': (_make_openness, _export_columns),
+    'archive_encode': (_make_recording, _encode_archive),
+    'archive_decode': (_make_archive, _decode_archive),
+}
+
+# Stages whose cost explodes with size are capped so a large run still finishes
+MAX_SAMPLES = {
+    'gazepoint_parse_legacy': 2_000_000,
+    'heatmap_kde': 100_000,
+    'test2_flatten': 2_000_000,
+}
+
+
+def run_stage(name, samples, batch_size=BATCH_SIZE, seed=0):
+    """Time one stage over samples split into batches.
+
+    Inputs are generated per batch outside the timed region, so the input
+    size is bounded by batch_size. Peak memory is measured with tracemalloc
+    on a separate, untimed batch.
+    """
+    make, run = STAGES[name]
+    rng = np.random.default_rng(seed)
+    samples = min(samples, MAX_SAMPLES.get(name, samples))
+    latencies = []
+    done = 0
+    while done < samples:
+        n = min(batch_size, samples - done)
+        data = make(n, rng)
+        gc.collect()
+        start = time.perf_counter()
+        run(data)
+        latencies.append((time.perf_counter() - start, n))
+        done += n
+        del data
+
+    data = make(min(batch_size, samples), rng)
+    gc.collect()
+    tracemalloc.start()
+    run(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    seconds = np.array([t for t, _ in latencies])
+    per_sample_us = np.array([t / n * 1e6 for t, n in latencies])
+    return {
+        'samples': done,
+        'batches': len(latencies),
+        'seconds': float(seconds.sum()),
+        'throughput_per_s': done / float(seconds.sum()),
+        'peak_memory_mb': peak / 2**20,
+        'batch_latency_ms': {f'p{q}': float(np.percentile(seconds, q) * 1e3) for q in (50, 95, 99)},
+        'per_sample_us': {f'p{q}': float(np.percentile(per_sample_us, q)) for q in (50, 95, 99)},
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results, baseline):
+    """Print throughput ratios against a previous results file."""
+    for name, stage in results['stages'].items():
+        old = baseline['stages'].get(name)
+        if 'throughput_per_s' not in stage or not old or 'throughput_per_s' not in old:
+            continue
+        ratio = old['throughput_per_s'] / stage['throughput_per_s']
+        flag = "⚠️ regression" if ratio > REGRESSION_RATIO else ""
+        print(f"{name:24s} {ratio:6.2f}x slower than {baseline['revision']} {flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark acquisition and analysis hot paths on synthetic gaze data")
+    parser.add_argument('--samples', type=float, default=1e5, help="samples per stage (1e4 - 1e8)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--stages', nargs='+', choices=sorted(STAGES), default=sorted(STAGES))
+    parser.add_argument('--output', help=f"results file (default: {RESULTS_DIR}/<revision>_<time>.json)")
+    parser.add_argument('--compare', help="previous results file to check for regressions")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = {
+        'revision': _git_revision(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'samples': int(args.samples),
+        'stages': {},
+    }
+    for name in args.stages:
+        try:
+            stage = run_stage(name, int(args.samples), args.batch_size, args.seed)
+        except SkipStage as e:
+            print(f"{name:24s} skipped: {e}")
+            results['stages'][name] = {'skipped': str(e)}
+            continue
+        results['stages'][name] = stage
+        print(f"{name:24s} {stage['throughput_per_s']:14,.0f} samples/s  "
+              f"p95 {stage['per_sample_us']['p95']:8.3f} us/sample  "
+              f"peak {stage['peak_memory_mb']:8.1f} MB")
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{results['revision']}_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Saved results to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
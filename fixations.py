@@ -0,0 +1,396 @@
+import math
+from collections import deque, namedtuple
+
+import numpy as np
+
+
+def _block_extrema(values, window_size, fill, op):
+    """Sliding max/min over windows of window_size (van Herk / Gil-Werman)."""
+    n = len(values)
+    n_blocks = -(-n // window_size)
+    padded = np.full(n_blocks * window_size, fill, dtype=float)
+    padded[:n] = np.where(np.isnan(values), fill, values)
+    blocks = padded.reshape(n_blocks, window_size)
+
+    # Running extremum from the left and from the right inside each block
+    prefix = op.accumulate(blocks, axis=1).ravel()
+    suffix = op.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    # Window [i, i + w - 1] = suffix[i] combined with prefix[i + w - 1]
+    starts = n - window_size + 1
+    return op(suffix[:starts], prefix[window_size - 1:n])
+
+
+def _window_counts(values, window_size):
+    """Number of non-NaN samples in every full window."""
+    valid = np.concatenate([[0], np.cumsum(~np.isnan(values))])
+    return valid[window_size:] - valid[:-window_size]
+
+
+def window_size_from_ms(window_ms, sampling_rate=None, timestamps=None):
+    """Convert a window length in milliseconds to a number of samples.
+
+    The sampling rate is either given in Hz or estimated from the median
+    interval of timestamps (in seconds).
+    """
+    if sampling_rate is None:
+        if timestamps is None:
+            raise ValueError("window_ms needs either sampling_rate or timestamps")
+        intervals = np.diff(np.asarray(timestamps, dtype=float))
+        intervals = intervals[intervals > 0]
+        if not len(intervals):
+            raise ValueError("cannot estimate sampling rate from timestamps")
+        sampling_rate = 1.0 / np.median(intervals)
+    return max(1, int(round(window_ms * sampling_rate / 1000.0)))
+
+
+def dispersion(x, y, window_size):
+    """Dispersion (x range + y range) of every full window of window_size samples.
+
+    Entry i covers samples i .. i + window_size - 1. NaN samples are ignored,
+    a window with no valid x or y sample has NaN dispersion.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if window_size < 1:
+        raise ValueError("window_size must be at least 1")
+    if len(x) < window_size:
+        return np.empty(0)
+
+    x_range = (_block_extrema(x, window_size, -np.inf, np.maximum)
+               - _block_extrema(x, window_size, np.inf, np.minimum))
+    y_range = (_block_extrema(y, window_size, -np.inf, np.maximum)
+               - _block_extrema(y, window_size, np.inf, np.minimum))
+    result = x_range + y_range
+    result[(_window_counts(x, window_size) == 0) | (_window_counts(y, window_size) == 0)] = np.nan
+    return result
+
+
+def fixation_mask(x, y, dispersion_threshold, window_size=None, window_ms=None,
+                  sampling_rate=None, timestamps=None):
+    """Boolean I-DT fixation mask for gaze coordinates x, y.
+
+    Every window start i in 0 .. n - window_size - 1 whose dispersion is below
+    dispersion_threshold marks samples i .. i + window_size (inclusive) as
+    fixation, like the original loop in more_stimuli.py did.
+    """
+    if window_size is None:
+        if window_ms is None:
+            raise ValueError("either window_size or window_ms is required")
+        window_size = window_size_from_ms(window_ms, sampling_rate, timestamps)
+
+    n = len(x)
+    mask = np.zeros(n, dtype=bool)
+    if n <= window_size:
+        return mask
+
+    disp = dispersion(x, y, window_size)[:n - window_size]
+    starts = np.flatnonzero(disp < dispersion_threshold)
+    if not len(starts):
+        return mask
+
+    # Mark the union of [start, start + window_size] intervals
+    edges = np.zeros(n + 1, dtype=np.int64)
+    edges[starts] += 1
+    edges[starts + window_size + 1] -= 1
+    return np.cumsum(edges[:n]) > 0
+
+
+def classify_idt(x, y, dispersion_threshold, window_size=None, window_ms=None,
+                 sampling_rate=None, timestamps=None):
+    """Label every sample as 'fixation' or 'saccade' with the I-DT algorithm."""
+    mask = fixation_mask(x, y, dispersion_threshold, window_size, window_ms,
+                         sampling_rate, timestamps)
+    return np.where(mask, 'fixation', 'saccade').astype(object)
+
+
+FIXATION_COLUMNS = ['start', 'end', 'start_time', 'end_time', 'duration', 'x', 'y']
+
+
+def fixation_table(x, y, t, movement, segments=None):
+    """One row per run of 'fixation' samples: sample range (end inclusive),
+    first and last sample time, duration and centroid (NaN samples ignored).
+
+    With segments (e.g. the stimulus column), runs are also split where the
+    segment changes.
+    """
+    import pandas as pd
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    t = np.asarray(t, dtype=float)
+    is_fixation = np.asarray(movement) == 'fixation'
+    boundary = np.ones(len(is_fixation) + 1, dtype=bool)
+    boundary[1:-1] = is_fixation[1:] != is_fixation[:-1]
+    if segments is not None:
+        segments = np.asarray(segments)
+        boundary[1:-1] |= segments[1:] != segments[:-1]
+    # Run i covers [bounds[i], bounds[i + 1]); keep the fixation runs
+    bounds = np.flatnonzero(boundary)
+    fixation_runs = is_fixation[bounds[:-1]] if len(is_fixation) else np.empty(0, dtype=bool)
+    starts = bounds[:-1][fixation_runs]
+    stops = bounds[1:][fixation_runs]
+
+    def run_means(values):
+        finite = np.isfinite(values)
+        sums = np.concatenate([[0.0], np.cumsum(np.where(finite, values, 0.0))])
+        counts = np.concatenate([[0], np.cumsum(finite)])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (sums[stops] - sums[starts]) / (counts[stops] - counts[starts])
+
+    ends = stops - 1
+    return pd.DataFrame({
+        'start': starts,
+        'end': ends,
+        'start_time': t[starts],
+        'end_time': t[ends],
+        'duration': t[ends] - t[starts],
+        'x': run_means(x),
+        'y': run_means(y),
+    }, columns=FIXATION_COLUMNS)
+
+
+# Default thresholds of the online detector (normalised display units)
+ONLINE_WINDOW_MS = 100.0
+VELOCITY_THRESHOLD = 1.0  # display widths per second, roughly 30 deg/s at 60 cm
+VELOCITY_WINDOW_MS = 20.0  # I-VT velocity span; averages out tracker noise
+MIN_FIXATION_MS = 60.0
+
+FixationEvent = namedtuple('FixationEvent', 'kind start_time end_time x y')
+
+
+class _Extremum:
+    """Monotonic deque giving the max (or min) of a span that only moves forward."""
+
+    def __init__(self, sign):
+        self.sign = sign
+        self.items = deque()
+
+    def push(self, index, value):
+        value *= self.sign
+        items = self.items
+        while items and items[-1][1] <= value:
+            items.pop()
+        items.append((index, value))
+
+    def expire(self, first_index):
+        items = self.items
+        while items[0][0] < first_index:
+            items.popleft()
+
+    def value(self):
+        return self.items[0][1] * self.sign
+
+    def clear(self):
+        self.items.clear()
+
+
+class _RunningMean:
+    """FIFO of (t, x, y) samples with running sums."""
+
+    def __init__(self):
+        self.samples = deque()
+        self.clear()
+
+    def clear(self):
+        self.samples.clear()
+        self.sum_t = self.sum_x = self.sum_y = 0.0
+
+    def push(self, t, x, y):
+        self.samples.append((t, x, y))
+        self.sum_t += t
+        self.sum_x += x
+        self.sum_y += y
+
+    def pop(self):
+        t, x, y = self.samples.popleft()
+        self.sum_t -= t
+        self.sum_x -= x
+        self.sum_y -= y
+        return t, x, y
+
+
+class OnlineFixationDetector:
+    """Streaming fixation detector, O(1) amortised work per sample.
+
+    Feed samples with update(t, x, y) (t in seconds); it returns a
+    FixationEvent when a fixation starts or ends and None otherwise.
+    Events are also passed to on_event if given.
+
+    mode='idt': a fixation starts as soon as the samples of the last
+    window_ms have a dispersion below dispersion_threshold, and ends at the
+    first sample that pushes the dispersion of the fixation over it.
+    mode='ivt': a fixation starts once the velocity has stayed below
+    velocity_threshold for min_duration_ms, and ends at the first faster
+    sample. The velocity is taken between the mean positions of the newer
+    and older half of the last velocity_window_ms, since sample-to-sample
+    velocities at 600 Hz are dominated by noise.
+    Samples with NaN coordinates (blinks, tracking loss) end a fixation.
+    """
+
+    def __init__(self, mode='idt', dispersion_threshold=0.05, window_ms=ONLINE_WINDOW_MS,
+                 velocity_threshold=VELOCITY_THRESHOLD, min_duration_ms=MIN_FIXATION_MS,
+                 velocity_window_ms=VELOCITY_WINDOW_MS, on_event=None):
+        if mode not in ('idt', 'ivt'):
+            raise ValueError(f"unknown mode {mode!r}, expected 'idt' or 'ivt'")
+        self.mode = mode
+        self.dispersion_threshold = dispersion_threshold
+        self.window = window_ms / 1000.0
+        self.velocity_threshold = velocity_threshold
+        self.min_duration = min_duration_ms / 1000.0
+        self.velocity_window = velocity_window_ms / 1000.0
+        self.on_event = on_event
+        self.fixating = False
+        self.last_event = None
+        self._update = self._update_idt if mode == 'idt' else self._update_ivt
+        self._max_x, self._min_x = _Extremum(1), _Extremum(-1)
+        self._max_y, self._min_y = _Extremum(1), _Extremum(-1)
+        self._span = deque()  # (index, t, x, y) of the candidate window or fixation
+        self._index = 0
+        self._previous = None
+        self._newer = _RunningMean()  # I-VT: samples of the last half window
+        self._older = _RunningMean()  # and of the half window before it
+        self._origin = 0.0
+        self._reset_span()
+
+    def _reset_span(self):
+        for extremum in (self._max_x, self._min_x, self._max_y, self._min_y):
+            extremum.clear()
+        self._span.clear()
+        self._sum_x = self._sum_y = 0.0
+        self._run_start = None
+        self._run_count = 0
+
+    def _emit(self, kind, start_time, end_time):
+        n = len(self._span) if self.mode == 'idt' else self._run_count
+        event = FixationEvent(kind, start_time, end_time, self._sum_x / n, self._sum_y / n)
+        self.last_event = event
+        if self.on_event is not None:
+            self.on_event(event)
+        return event
+
+    def update(self, t, x, y):
+        if x != x or y != y:
+            return self._lost(t)
+        return self._update(t, x, y)
+
+    def update_binocular(self, t, left_x, left_y, right_x, right_y, left_valid=True, right_valid=True):
+        """Update with the mean of whichever eyes are valid (flagged valid and not NaN)."""
+        left = left_valid and left_x == left_x and left_y == left_y
+        right = right_valid and right_x == right_x and right_y == right_y
+        if left and right:
+            return self._update(t, (left_x + right_x) / 2, (left_y + right_y) / 2)
+        if left:
+            return self._update(t, left_x, left_y)
+        if right:
+            return self._update(t, right_x, right_y)
+        return self._lost(t)
+
+    def _lost(self, t):
+        event = None
+        if self.fixating:
+            end = self._span[-1][1] if self.mode == 'idt' else self._previous[0]
+            event = self._emit('end', self.last_event.start_time, end)
+            self.fixating = False
+        self._reset_span()
+        self._previous = None
+        self._newer.clear()
+        self._older.clear()
+        return event
+
+    def _push(self, t, x, y):
+        index = self._index
+        self._index += 1
+        self._max_x.push(index, x)
+        self._min_x.push(index, x)
+        self._max_y.push(index, y)
+        self._min_y.push(index, y)
+        self._span.append((index, t, x, y))
+        self._sum_x += x
+        self._sum_y += y
+
+    def _pop_oldest(self):
+        _, _, x, y = self._span.popleft()
+        self._sum_x -= x
+        self._sum_y -= y
+        first = self._span[0][0]
+        for extremum in (self._max_x, self._min_x, self._max_y, self._min_y):
+            extremum.expire(first)
+
+    def _dispersion_with(self, x, y):
+        return ((max(self._max_x.value(), x) - min(self._min_x.value(), x))
+                + (max(self._max_y.value(), y) - min(self._min_y.value(), y)))
+
+    def _update_idt(self, t, x, y):
+        span = self._span
+        if self.fixating:
+            if self._dispersion_with(x, y) < self.dispersion_threshold:
+                self._push(t, x, y)
+                return None
+            event = self._emit('end', self.last_event.start_time, span[-1][1])
+            self.fixating = False
+            self._reset_span()
+            self._push(t, x, y)
+            return event
+
+        self._push(t, x, y)
+        # Keep the shortest candidate window that still covers window_ms
+        while len(span) > 1 and t - span[1][1] >= self.window:
+            self._pop_oldest()
+        if t - span[0][1] >= self.window and self._dispersion_with(x, y) < self.dispersion_threshold:
+            self.fixating = True
+            return self._emit('start', span[0][1], None)
+        return None
+
+    def _velocity(self, t, x, y):
+        """Speed between the centroids of the two half windows, None until both exist."""
+        newer, older = self._newer, self._older
+        if not newer.samples:
+            # Times relative to the first sample keep the running sums precise
+            self._origin = t
+        t -= self._origin
+        newer.push(t, x, y)
+        half = self.velocity_window / 2
+        while len(newer.samples) > 1 and newer.samples[0][0] <= t - half:
+            older.push(*newer.pop())
+        # The older half keeps at least one sample, so slow trackers still get a velocity
+        while len(older.samples) > 1 and older.samples[0][0] <= t - self.velocity_window:
+            older.pop()
+        if not older.samples:
+            return None
+        dt = newer.sum_t / len(newer.samples) - older.sum_t / len(older.samples)
+        dx = newer.sum_x / len(newer.samples) - older.sum_x / len(older.samples)
+        dy = newer.sum_y / len(newer.samples) - older.sum_y / len(older.samples)
+        return math.hypot(dx, dy) / dt
+
+    def _update_ivt(self, t, x, y):
+        previous = self._previous
+        if previous is not None and t <= previous[0]:
+            return None
+        self._previous = (t, x, y)
+        velocity = self._velocity(t, x, y)
+        if velocity is None:
+            return None
+
+        if velocity < self.velocity_threshold:
+            if self._run_start is None:
+                # The run starts with the newer half window, which is already steady
+                newer = self._newer
+                self._run_start = newer.samples[0][0] + self._origin
+                self._run_count = len(newer.samples)
+                self._sum_x, self._sum_y = newer.sum_x, newer.sum_y
+            else:
+                self._run_count += 1
+                self._sum_x += x
+                self._sum_y += y
+            if not self.fixating and t - self._run_start >= self.min_duration:
+                self.fixating = True
+                return self._emit('start', self._run_start, None)
+            return None
+
+        event = None
+        if self.fixating:
+            event = self._emit('end', self._run_start, previous[0])
+            self.fixating = False
+        self._run_start = None
+        return event
@@ -0,0 +1,98 @@
+import re
+from operator import itemgetter
+
+# Output column -> Open Gaze API attribute of a <REC .../> record
+GAZE_FIELDS = (
+    ('device_time_stamp', b'TIME'),
+    ('left_gaze_x', b'LPOGX'),
+    ('left_gaze_y', b'LPOGY'),
+    ('left_pupil', b'LPUPILD'),
+    ('left_validity', b'LPOGV'),
+    ('right_gaze_x', b'RPOGX'),
+    ('right_gaze_y', b'RPOGY'),
+    ('right_pupil', b'RPUPILD'),
+    ('right_validity', b'RPOGV'),
+)
+GAZE_COLUMNS = tuple(name for name, _ in GAZE_FIELDS)
+
+# The same attributes in the order the server writes them within a record
+_RECORD_ORDER = (b'TIME', b'LPOGX', b'LPOGY', b'LPOGV', b'RPOGX', b'RPOGY', b'RPOGV', b'LPUPILD', b'RPUPILD')
+# One match per record captures just those values; every other NAME="value"
+# pair is skipped whole, so a key can never match inside a value
+_REC_RE = re.compile(b'<REC' + b''.join(rb'(?:[^"]*"[^"]*")*? ' + key + rb'="([^"]*)"' for key in _RECORD_ORDER))
+_TO_COLUMNS = itemgetter(*(_RECORD_ORDER.index(key) for _, key in GAZE_FIELDS))
+_TERMINATOR = b'\r\n'
+# A record is well under 1 kB; this much data without a \r\n is not the Open Gaze API
+MAX_PENDING = 65536
+
+
+def gaze_sample(line):
+    """Tuple of floats in GAZE_COLUMNS order from one <REC .../> line.
+
+    None for records without gaze; ValueError for gaze records that miss a
+    field or hold a value that is not a number.
+    """
+    match = _REC_RE.match(line)
+    if match is None:
+        if b' LPOGX="' in line:
+            raise ValueError("incomplete gaze record")
+        return None
+    return tuple(map(float, _TO_COLUMNS(match.groups())))
+
+
+class GazepointStream:
+    """Incremental parser for the Gazepoint Open Gaze API TCP stream.
+
+    Bytes are read with recv_into into a reusable buffer. Anything after the
+    last \\r\\n is carried over to the next read, so records split across
+    packets are reassembled instead of dropped; a carry-over longer than
+    MAX_PENDING is discarded and counted as malformed.
+    """
+
+    def __init__(self, sock=None, recv_size=65536):
+        self.sock = sock
+        self._recv_buf = bytearray(recv_size)
+        self._recv_view = memoryview(self._recv_buf)
+        self._pending = bytearray()
+        self.records = 0
+        self.malformed = 0
+
+    def feed(self, data):
+        """Add raw bytes and return the gaze samples of every completed record."""
+        self._pending += data
+        complete = b''
+        end = self._pending.rfind(_TERMINATOR)
+        if end >= 0:
+            complete = bytes(self._pending[:end])
+            del self._pending[:end + len(_TERMINATOR)]
+        if len(self._pending) > MAX_PENDING:
+            # Drop the runaway partial record instead of buffering it without bound
+            self.malformed += 1
+            self._pending.clear()
+
+        samples = []
+        for line in complete.split(_TERMINATOR):
+            if not line.startswith(b'<REC'):
+                continue
+            if not line.rstrip().endswith(b'/>'):
+                self.malformed += 1
+                continue
+            try:
+                sample = gaze_sample(line)
+            except ValueError:
+                self.malformed += 1
+                continue
+            self.records += 1
+            if sample is not None:
+                samples.append(sample)
+        return samples
+
+    def read(self):
+        """Block for the next chunk from the socket and return its samples.
+
+        Raises ConnectionError once the peer has closed the connection.
+        """
+        n = self.sock.recv_into(self._recv_buf)
+        if n == 0:
+            raise ConnectionError("Gazepoint closed the connection")
+        return self.feed(self._recv_view[:n])
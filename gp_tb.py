@@ -1,51 +1,70 @@
-import socket
-import time
 import threading
 from datetime import datetime
-import xml.etree.ElementTree as ET
-import pandas as pd
-import tobii_research as tr
-from psychopy import visual, core, event
-
-# Lists to store data
-gazepoint_data = []
-tobii_data = []
+# PsychoPy, the Tobii SDK and pandas are imported in main(), while the
+# devices connect, so starting the script does not wait for them
+from launcher import (DeviceConnector, gaze_output_frequency, gazepoint_endpoint, load_cache, parse_endpoint,
+                      preload, save_cache)
+from gazepoint_stream import GazepointStream
+from tobii_convert import gaze_sample as tobii_sample
+from sample_store import SampleStore, GAZEPOINT_SCHEMA, TOBII_SCHEMA
+from acquisition import HostClock, SampleQueue, QueueConsumer, StatusReporter
+from fixations import OnlineFixationDetector
+from metrics import DeviceMetrics, write_summary
+
+# Columnar stores for the collected data
+gazepoint_data = SampleStore(GAZEPOINT_SCHEMA)
+tobii_data = SampleStore(TOBII_SCHEMA)
+
+# Tobii callbacks stamp, convert to a tuple and enqueue; a consumer thread stores
+clock = HostClock()
+tobii_queue = SampleQueue()
+
+# Sample rate, gap and latency metrics per device. The Tobii rate is read from
+# the tracker once connected; the Gazepoint API does not report it, so it is
+# estimated from the device's TIME intervals.
+gazepoint_metrics = DeviceMetrics('gazepoint')
+tobii_metrics = DeviceMetrics('tobii')
+
+# Live fixation state of each tracker, shown in the status line. The device
+# clocks differ, so every tracker has its own detector.
+gazepoint_fixations = OnlineFixationDetector(mode='idt')
+tobii_fixations = OnlineFixationDetector(mode='idt')
 
 # Flags
 running = True
-current_stimulus = "none"
 
-def connect_gazepoint():
-    try:
-        HOST = '127.0.0.1'
-        PORT = 4242
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.connect((HOST, PORT))
-        print("✅ Connected to Gazepoint API")
-        return s
-    except Exception as e:
-        print(f"❌ Error connecting to Gazepoint: {e}")
-        return None
+# Samples are stored unlabelled; the writers assign stimuli from their host
+# stamps and the flip-locked onsets logged by StimulusManager
+UNLABELLED = "none"
 
-def connect_tobii():
-    try:
-        eyetrackers = tr.find_all_eyetrackers()
-        if eyetrackers:
-            print(f"✅ Connected to Tobii: {eyetrackers[0].model}")
-            return eyetrackers[0]
-        else:
-            print("❌ No Tobii eyetracker found")
-            return None
-    except Exception as e:
-        print(f"❌ Error connecting to Tobii: {e}")
-        return None
+# Recording format: 'csv', 'binary', 'parquet' (needs pyarrow) or 'archive' (compressed, see archive.py)
+RECORDING_FORMAT = 'csv'
+
+# 'threads': readers share this interpreter with PsychoPy.
+# 'processes': each tracker runs in a worker process (process_acquisition.py),
+# so reading samples never holds the GIL the render loop needs.
+ACQUISITION_MODE = 'threads'
 
 def tobii_gaze_callback(gaze_data):
     if running:
-        gaze_data["system_time_now"] = int(datetime.now().timestamp() * 1000)
-        gaze_data["stimulus"] = current_stimulus
-        tobii_data.append(gaze_data)
-        print(f"\rGazepoint: {len(gazepoint_data)}, Tobii: {len(tobii_data)}", end='')
+        tobii_queue.push((clock.now(), tobii_sample(gaze_data)))
+
+def store_tobii_samples(items):
+    tobii_metrics.observe_queue(len(items) + len(tobii_queue))
+    for stamp, sample in items:
+        device_time, left_x, left_y, _, left_valid, right_x, right_y, _, right_valid = sample
+        tobii_metrics.update(device_time, stamp)
+        tobii_data.append((clock.to_epoch_ms(stamp), stamp) + sample, UNLABELLED)
+        tobii_fixations.update_binocular(device_time / 1e6, left_x, left_y, right_x, right_y,
+                                         left_valid, right_valid)
+
+def collection_status():
+    status = ' | '.join(metrics.status() + (", fixating" if detector.fixating else "")
+                        for metrics, detector in ((gazepoint_metrics, gazepoint_fixations),
+                                                  (tobii_metrics, tobii_fixations)))
+    if tobii_queue.dropped:
+        status += f" (Tobii dropped: {tobii_queue.dropped})"
+    return status
 
 def gazepoint_collection(sock):
     try:
@@ -62,81 +81,80 @@ def gazepoint_collection(sock):
         for cmd in commands:
             sock.send(str.encode(cmd + '\r\n'))
 
+        stream = GazepointStream(sock)
         while running:
             try:
-                data = sock.recv(1024).decode(errors='ignore')
-                lines = data.strip().split('\r\n')
-                for line in lines:
-                    if not line.startswith('<REC'):
-                        continue
-                    root = ET.fromstring(line)
-                    now_ms = int(datetime.now().timestamp() * 1000)
-                    if root.get('LPOGX') is not None:
-                        gaze_data = {
-                            'system_time_now': now_ms,
-                            'device_time_stamp': float(root.get('TIME', 0)),
-                            'left_gaze_x': float(root.get('LPOGX', 0)),
-                            'left_gaze_y': float(root.get('LPOGY', 0)),
-                            'left_pupil': float(root.get('LPUPILD', 0)),
-                            'left_validity': float(root.get('LPOGV', 0)),
-                            'right_gaze_x': float(root.get('RPOGX', 0)),
-                            'right_gaze_y': float(root.get('RPOGY', 0)),
-                            'right_pupil': float(root.get('RPUPILD', 0)),
-                            'right_validity': float(root.get('RPOGV', 0)),
-                            'stimulus': current_stimulus
-                        }
-                        gazepoint_data.append(gaze_data)
-                        print(f"\rGazepoint: {len(gazepoint_data)}, Tobii: {len(tobii_data)}", end='')
+                samples = stream.read()
+                if not samples:
+                    continue
+                stamp = clock.now()
+                host = (clock.to_epoch_ms(stamp), stamp)
+                for sample in samples:
+                    gazepoint_data.append(host + sample, UNLABELLED)
+                    device_time, left_x, left_y, _, left_valid, right_x, right_y, _, right_valid = sample
+                    gazepoint_metrics.update(device_time, stamp)
+                    gazepoint_fixations.update_binocular(device_time, left_x, left_y, right_x, right_y,
+                                                         left_valid, right_valid)
             except OSError:
                 break
     except Exception as e:
         print(f"\n❌ Gazepoint collection error: {e}")
 
-def process_tobii_data(data):
-    return {
-        'system_time_now': data['system_time_now'],
-        'device_time_stamp': data.get('device_time_stamp', 0),
-        'left_gaze_x': data.get('left_gaze_point_on_display_area', [0,0])[0],
-        'left_gaze_y': data.get('left_gaze_point_on_display_area', [0,0])[1],
-        'left_pupil': data.get('left_pupil_diameter', 0),
-        'left_validity': data.get('left_gaze_point_validity', 0),
-        'right_gaze_x': data.get('right_gaze_point_on_display_area', [0,0])[0],
-        'right_gaze_y': data.get('right_gaze_point_on_display_area', [0,0])[1],
-        'right_pupil': data.get('right_pupil_diameter', 0),
-        'right_validity': data.get('right_gaze_point_validity', 0),
-        'stimulus': data.get('stimulus', 'none')
-    }
-
-def show_stimulus(win, image_stim, sock, stim_name, duration=5.0):
-    global current_stimulus
-    current_stimulus = stim_name
-    print(f"\n🖼️ Showing {stim_name} for {duration} seconds...")
-
-    image_stim.image = stim_name
-    image_stim.draw()
-    win.flip()
-
+def stimulus_onset(sock, stim_name):
+    # Runs right after the flip that shows the stimulus
     try:
         sock.send(str.encode(f'<SET ID="USER_EVENT" VALUE="{stim_name}_start" />\r\n'))
     except Exception as e:
         print(f"❌ Failed to send USER_EVENT: {e}")
 
-    start_time = time.time()
-    while time.time() - start_time < duration:
-        if event.getKeys(['escape']):
-            return False
-        core.wait(0.1)
-    return True
+def process_stimulus_onset(acquisition, stim_name):
+    # Same as stimulus_onset, for ACQUISITION_MODE = 'processes'
+    acquisition.user_event(f"{stim_name}_start")
 
-def main():
+def show_stimulus(stimuli, stim_name, duration=5.0):
+    print(f"\n🖼️ Showing {stim_name} for {duration} seconds...")
+    return stimuli.present(stim_name, duration)
+
+def main(gazepoint=None, rediscover=False):
+    """Run the session; gazepoint is a (host, port) endpoint, rediscover ignores cached addresses."""
     global running
 
-    # Connect to trackers
-    gp_socket = connect_gazepoint()
-    tobii_tracker = connect_tobii()
-    if not gp_socket or not tobii_tracker:
-        print("❌ Connection failed.")
-        return
+    # Connect to both trackers at once and load heavy modules meanwhile
+    processes = ACQUISITION_MODE == 'processes'
+    warmup = preload('pandas', 'recording_writer')
+    if processes:
+        from process_acquisition import ProcessAcquisition
+        cache = load_cache()
+        acquisition = ProcessAcquisition({'gazepoint': gazepoint_data, 'tobii': tobii_data}, clock,
+                                         gazepoint=gazepoint_endpoint(cache, gazepoint),
+                                         tobii_address=None if rediscover else cache.get('tobii_address'))
+        acquisition.launch()
+    else:
+        connector = DeviceConnector(gazepoint=gazepoint, rediscover=rediscover)
+    from psychopy import visual, core
+    from stimulus_manager import StimulusManager
+
+    if processes:
+        try:
+            acquisition.wait_connected()
+        except (ConnectionError, TimeoutError) as e:
+            print(f"❌ Connection failed: {e}")
+            return
+        cache.update(gazepoint=acquisition.trackers['gazepoint'].address,
+                     tobii_address=acquisition.trackers['tobii'].address)
+        save_cache(cache)
+        on_onset = lambda stim_name, flip_ns: process_stimulus_onset(acquisition, stim_name)
+    else:
+        connections = connector.result()
+        gp_socket, tobii_tracker = connections['gazepoint'], connections['tobii']
+        if not gp_socket or not tobii_tracker:
+            print("❌ Connection failed.")
+            return
+        import tobii_research as tr
+        rate_hz = gaze_output_frequency(tobii_tracker)
+        if rate_hz:
+            tobii_metrics.set_nominal_rate(rate_hz)
+        on_onset = lambda stim_name, flip_ns: stimulus_onset(gp_socket, stim_name)
 
     # Create window using custom monitor
     win = visual.Window(
@@ -144,20 +162,41 @@ def main():
         color="gray",
         units="pix"
     )
-    image_stim = visual.ImageStim(win, size=(800, 600))
-
-    # Start threads
-    tobii_tracker.subscribe_to(tr.EYETRACKER_GAZE_DATA, tobii_gaze_callback, as_dictionary=True)
-    gp_thread = threading.Thread(target=gazepoint_collection, args=(gp_socket,))
-    gp_thread.start()
+    # Preload all stimuli before recording starts
+    stimuli = StimulusManager(win, ["face.jpg", "beach.jpg"], now=clock.now, on_onset=on_onset)
+
+    # Stream recordings to disk while collecting
+    warmup.join()
+    from recording_writer import RecordingWriter, EXTENSIONS
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    ext = EXTENSIONS[RECORDING_FORMAT]
+    gp_writer = RecordingWriter(gazepoint_data, f'gazepoint_data_{timestamp}.{ext}', RECORDING_FORMAT,
+                                stimulus_labels=stimuli.labels)
+    tobii_writer = RecordingWriter(tobii_data, f'tobii_data_{timestamp}.{ext}', RECORDING_FORMAT,
+                                   stimulus_labels=stimuli.labels)
+    gp_writer.start()
+    tobii_writer.start()
+
+    # Start threads (or worker processes)
+    if processes:
+        acquisition.start()
+        status = StatusReporter(acquisition.status)
+    else:
+        tobii_consumer = QueueConsumer(tobii_queue, store_tobii_samples)
+        tobii_consumer.start()
+        tobii_tracker.subscribe_to(tr.EYETRACKER_GAZE_DATA, tobii_gaze_callback, as_dictionary=True)
+        gp_thread = threading.Thread(target=gazepoint_collection, args=(gp_socket,))
+        gp_thread.start()
+        status = StatusReporter(collection_status)
+    status.start()
 
     try:
         win.flip()
         core.wait(1.0)
 
-        if not show_stimulus(win, image_stim, gp_socket, "face.jpg"):
+        if not show_stimulus(stimuli, "face.jpg"):
             return
-        if not show_stimulus(win, image_stim, gp_socket, "beach.jpg"):
+        if not show_stimulus(stimuli, "beach.jpg"):
             return
 
     except Exception as e:
@@ -166,30 +205,47 @@ def main():
     finally:
         print("\n🛑 Stopping data collection...")
         running = False
-        gp_thread.join()
-
-        try:
-            gp_socket.send(str.encode('<SET ID="ENABLE_SEND_DATA" STATE="0" />\r\n'))
-            gp_socket.close()
-        except Exception as e:
-            print(f"Gazepoint close error: {e}")
+        if processes:
+            device_metrics = list(acquisition.close().values())
+            queue_dropped = {name: tracker.dropped for name, tracker in acquisition.trackers.items()}
+        else:
+            gp_thread.join()
 
-        tobii_tracker.unsubscribe_from(tr.EYETRACKER_GAZE_DATA, tobii_gaze_callback)
+            try:
+                gp_socket.send(str.encode('<SET ID="ENABLE_SEND_DATA" STATE="0" />\r\n'))
+                gp_socket.close()
+            except Exception as e:
+                print(f"Gazepoint close error: {e}")
+
+            tobii_tracker.unsubscribe_from(tr.EYETRACKER_GAZE_DATA, tobii_gaze_callback)
+            tobii_consumer.close()
+            device_metrics = [gazepoint_metrics, tobii_metrics]
+            queue_dropped = {'tobii': tobii_queue.dropped}
+        status.close()
+        stimuli.clear()
         win.close()
+        stimuli.write_log(f'stimuli_{timestamp}.csv', clock.to_epoch_ms)
 
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        gp_rows = gp_writer.close()
+        tobii_rows = tobii_writer.close()
+        write_summary(f'metrics_{timestamp}.json', device_metrics,
+                      acquisition_mode=ACQUISITION_MODE, queue_dropped=queue_dropped)
 
         if gazepoint_data:
-            pd.DataFrame(gazepoint_data).to_csv(f'gazepoint_data_{timestamp}.csv', index=False)
-            print(f"✅ Saved Gazepoint data ({len(gazepoint_data)} rows)")
+            print(f"✅ Saved Gazepoint data ({gp_rows} rows)")
 
         if tobii_data:
-            processed = [process_tobii_data(d) for d in tobii_data]
-            pd.DataFrame(processed).to_csv(f'tobii_data_{timestamp}.csv', index=False)
-            print(f"✅ Saved Tobii data ({len(processed)} rows)")
+            print(f"✅ Saved Tobii data ({tobii_rows} rows)")
 
         if not gazepoint_data and not tobii_data:
             print("⚠️ No data collected.")
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Record Gazepoint and Tobii gaze while showing stimuli")
+    parser.add_argument('--gazepoint', type=parse_endpoint, default=None,
+                        help="Gazepoint API endpoint, HOST[:PORT] (default: last working one, else 127.0.0.1:4242)")
+    parser.add_argument('--rediscover', action='store_true', help="ignore cached device addresses")
+    args = parser.parse_args()
+    main(args.gazepoint, args.rediscover)
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+
+# Screen and image layout used by more_stimuli.py
+SCREEN_WIDTH, SCREEN_HEIGHT = 1536, 864
+IMAGE_X, IMAGE_Y = 368, 132
+IMAGE_WIDTH, IMAGE_HEIGHT = 800, 600
+
+# Viewing geometry for converting degrees of visual angle to pixels
+SCREEN_WIDTH_CM = 34.5
+VIEWING_DISTANCE_CM = 60.0
+SIGMA_DEG = 1.0
+
+CACHE_DIR = 'heatmap_cache'
+
+
+def pixels_per_degree(screen_width_px=SCREEN_WIDTH, screen_width_cm=SCREEN_WIDTH_CM,
+                      distance_cm=VIEWING_DISTANCE_CM):
+    """Pixels spanned by one degree of visual angle at the screen centre."""
+    cm_per_degree = 2 * distance_cm * math.tan(math.radians(0.5))
+    return cm_per_degree * screen_width_px / screen_width_cm
+
+
+def screen_to_image(x, y):
+    """Normalised display coordinates to image pixels (origin bottom-left).
+
+    Same conversion as more_stimuli.py: y is flipped to screen pixels and the
+    image offset is subtracted.
+    """
+    image_x = np.asarray(x, dtype=float) * SCREEN_WIDTH - IMAGE_X
+    image_y = (1 - np.asarray(y, dtype=float)) * SCREEN_HEIGHT - IMAGE_Y
+    return image_x, image_y
+
+
+def bin_gaze(x, y, width=IMAGE_WIDTH, height=IMAGE_HEIGHT):
+    """Count gaze samples per pixel; samples outside the image are dropped."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    inside = (x >= 0) & (x <= width) & (y >= 0) & (y <= height)
+    col = np.minimum(x[inside].astype(np.int64), width - 1)
+    row = np.minimum(y[inside].astype(np.int64), height - 1)
+    counts = np.bincount(row * width + col, minlength=width * height)
+    return counts.reshape(height, width).astype(float)
+
+
+def _smooth_axis(grid, kernel, axis):
+    size = grid.shape[axis]
+    n = size + len(kernel) - 1
+    spectrum = np.fft.rfft(grid, n=n, axis=axis)
+    shape = [1, 1]
+    shape[axis] = -1
+    spectrum *= np.fft.rfft(kernel, n=n).reshape(shape)
+    full = np.fft.irfft(spectrum, n=n, axis=axis)
+    start = len(kernel) // 2
+    return np.take(full, np.arange(start, start + size), axis=axis)
+
+
+def gaussian_smooth(grid, sigma_px):
+    """Separable Gaussian blur done as two 1-D FFT convolutions (zero padded)."""
+    if sigma_px <= 0:
+        return grid
+    radius = int(math.ceil(3 * sigma_px))
+    offsets = np.arange(-radius, radius + 1)
+    kernel = np.exp(-0.5 * (offsets / sigma_px) ** 2)
+    kernel /= kernel.sum()
+    smoothed = _smooth_axis(_smooth_axis(grid, kernel, 0), kernel, 1)
+    return np.maximum(smoothed, 0)
+
+
+def fixation_density(x, y, sigma_deg=SIGMA_DEG, width=IMAGE_WIDTH, height=IMAGE_HEIGHT):
+    """Smoothed fixation density over the image, normalised to sum to 1."""
+    density = gaussian_smooth(bin_gaze(x, y, width, height), sigma_deg * pixels_per_degree())
+    total = density.sum()
+    return density / total if total > 0 else density
+
+
+class DensityCache:
+    """Density arrays cached on disk per (session, stimulus, parameters).
+
+    The session key includes the file's size and modification time, so a
+    re-recorded or re-classified session is recomputed.
+    """
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        self._memory = {}
+
+    def _key(self, session_path, stimulus, params):
+        stat = os.stat(session_path)
+        key = json.dumps([os.path.abspath(session_path), stat.st_size, stat.st_mtime_ns,
+                          stimulus, params, SCREEN_WIDTH, SCREEN_HEIGHT, IMAGE_X, IMAGE_Y,
+                          IMAGE_WIDTH, IMAGE_HEIGHT, SCREEN_WIDTH_CM, VIEWING_DISTANCE_CM],
+                         sort_keys=True)
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def get(self, session_path, stimulus, params, compute):
+        """Cached density, calling compute() to build it on a miss."""
+        key = self._key(session_path, stimulus, params)
+        if key in self._memory:
+            return self._memory[key]
+        path = os.path.join(self.directory, f'{key}.npy')
+        if os.path.exists(path):
+            density = np.load(path)
+        else:
+            density = compute()
+            os.makedirs(self.directory, exist_ok=True)
+            np.save(path, density)
+        self._memory[key] = density
+        return density
+
+
+def render_heatmaps(items, output_pattern="fixation_heatmap_{name}.png", dpi=300, cmap="Reds", alpha=0.6):
+    """Save a density overlay on its stimulus image for every (name, image, density).
+
+    Uses the non-interactive Agg backend and a single reused figure.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from PIL import Image
+
+    fig, ax = plt.subplots(figsize=(8, 6))
+    colormap = plt.get_cmap(cmap)
+    paths = []
+    images = {}
+    for name, image_file, density in items:
+        if image_file not in images:
+            images[image_file] = np.asarray(Image.open(image_file))
+        height, width = density.shape
+
+        # Transparent where there is no density, like the filled KDE contours
+        peak = density.max()
+        scaled = density / peak if peak > 0 else density
+        overlay = colormap(scaled)
+        overlay[..., 3] = np.where(scaled > 0.05, alpha, 0)
+
+        ax.clear()
+        ax.imshow(images[image_file], extent=[0, width, 0, height], aspect='auto')
+        ax.imshow(overlay, extent=[0, width, 0, height], origin='lower', aspect='auto')
+        ax.set_xlabel("X (pixel)")
+        ax.set_ylabel("Y (pixel)")
+        ax.set_title(f"Heatmap Fixations for {name}")
+        path = output_pattern.format(name=name)
+        fig.savefig(path, dpi=dpi)
+        paths.append(path)
+    plt.close(fig)
+    return paths
@@ -0,0 +1,178 @@
+import importlib
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Gazepoint Control server endpoint; override with GAZEPOINT_HOST/GAZEPOINT_PORT
+GAZEPOINT_HOST = os.environ.get('GAZEPOINT_HOST', '127.0.0.1')
+GAZEPOINT_PORT = int(os.environ.get('GAZEPOINT_PORT', '4242'))
+
+DEVICE_CACHE = 'device_cache.json'  # last working device addresses
+CONNECT_TIMEOUT = 3.0     # seconds per attempt
+DISCOVERY_TIMEOUT = 5.0   # seconds for tobii_research.find_all_eyetrackers
+RETRIES = 3
+RETRY_DELAY = 0.5         # seconds between attempts
+
+
+def parse_endpoint(text, default_port=GAZEPOINT_PORT):
+    """'host', 'host:port' or ':port' -> (host, port)."""
+    host, _, port = text.rpartition(':') if ':' in text else (text, '', '')
+    return host or GAZEPOINT_HOST, int(port) if port else default_port
+
+
+def preload(*modules):
+    """Import modules in a background thread; returns the thread.
+
+    Used for heavy imports (pandas, the Tobii SDK) that are needed later,
+    so they load while devices connect instead of before or during a trial.
+    """
+    def run():
+        for module in modules:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                pass
+    thread = threading.Thread(target=run, name='preload', daemon=True)
+    thread.start()
+    return thread
+
+
+def _with_timeout(function, timeout, what):
+    """Run a call that has no timeout of its own in a daemon thread."""
+    result = {}
+
+    def run():
+        try:
+            result['value'] = function()
+        except Exception as e:
+            result['error'] = e
+    thread = threading.Thread(target=run, name=what, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise TimeoutError(f"{what} did not finish within {timeout} s")
+    if 'error' in result:
+        raise result['error']
+    return result['value']
+
+
+def _retry(connect, what, retries=RETRIES, delay=RETRY_DELAY):
+    error = None
+    for attempt in range(retries):
+        if attempt:
+            time.sleep(delay)
+        try:
+            return connect()
+        except Exception as e:
+            error = e
+    raise ConnectionError(f"{what}: {error}")
+
+
+def connect_gazepoint(host=GAZEPOINT_HOST, port=GAZEPOINT_PORT, timeout=CONNECT_TIMEOUT, retries=RETRIES):
+    """Connected blocking socket to the Gazepoint API, or ConnectionError."""
+    def connect():
+        sock = socket.create_connection((host, port), timeout=timeout)
+        sock.settimeout(None)
+        return sock
+    return _retry(connect, f"Gazepoint at {host}:{port}", retries)
+
+
+def connect_tobii(address=None, timeout=DISCOVERY_TIMEOUT, retries=RETRIES):
+    """Tobii EyeTracker, or ConnectionError.
+
+    A known address is opened directly, which skips discovery; if that
+    fails, find_all_eyetrackers() is used.
+    """
+    import tobii_research as tr
+
+    def connect():
+        if address:
+            try:
+                return _with_timeout(lambda: tr.EyeTracker(address), timeout, 'Tobii connection')
+            except Exception:
+                pass
+        trackers = _with_timeout(tr.find_all_eyetrackers, timeout, 'Tobii discovery')
+        if not trackers:
+            raise ConnectionError("no Tobii eyetracker found")
+        return trackers[0]
+    return _retry(connect, "Tobii", retries)
+
+
+def gaze_output_frequency(tracker):
+    """The Tobii's configured gaze rate in Hz, or None if it cannot be read."""
+    try:
+        return float(tracker.get_gaze_output_frequency())
+    except Exception as e:
+        print(f"⚠️ Could not read the Tobii gaze output frequency, estimating it: {e}")
+        return None
+
+
+def load_cache(path=DEVICE_CACHE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache, path=DEVICE_CACHE):
+    try:
+        with open(path, 'w') as f:
+            json.dump(cache, f, indent=2)
+    except OSError as e:
+        print(f"⚠️ Could not save device cache: {e}")
+
+
+def gazepoint_endpoint(cache, gazepoint=None):
+    """Explicit endpoint, then GAZEPOINT_HOST/GAZEPOINT_PORT, then the last working one."""
+    if gazepoint is None and not {'GAZEPOINT_HOST', 'GAZEPOINT_PORT'} & set(os.environ):
+        gazepoint = cache.get('gazepoint')
+    return tuple(gazepoint or (GAZEPOINT_HOST, GAZEPOINT_PORT))
+
+
+class DeviceConnector:
+    """Connects the configured devices concurrently in the background.
+
+    Construction returns at once; result() waits (bounded by the per-device
+    timeouts and retries) and returns {device: connection or None}. Working
+    addresses are written to the cache so the next start skips discovery;
+    rediscover=True ignores the cached Tobii address.
+    """
+
+    def __init__(self, devices=('gazepoint', 'tobii'), gazepoint=None, cache_path=DEVICE_CACHE,
+                 rediscover=False, retries=RETRIES):
+        self.cache_path = cache_path
+        self.cache = load_cache(cache_path)
+        self.gazepoint_endpoint = gazepoint_endpoint(self.cache, gazepoint)
+        self.tobii_address = None if rediscover else self.cache.get('tobii_address')
+        self._pool = ThreadPoolExecutor(max_workers=len(devices), thread_name_prefix='connect')
+        self._futures = {}
+        if 'gazepoint' in devices:
+            self._futures['gazepoint'] = self._pool.submit(connect_gazepoint, *self.gazepoint_endpoint,
+                                                           retries=retries)
+        if 'tobii' in devices:
+            self._futures['tobii'] = self._pool.submit(connect_tobii, self.tobii_address, retries=retries)
+        self._pool.shutdown(wait=False)
+
+    def result(self):
+        connections = {}
+        for name, future in self._futures.items():
+            try:
+                connections[name] = future.result()
+            except Exception as e:
+                print(f"❌ Error connecting to {name}: {e}")
+                connections[name] = None
+
+        if connections.get('gazepoint') is not None:
+            host, port = self.gazepoint_endpoint
+            print(f"✅ Connected to Gazepoint API at {host}:{port}")
+            self.cache['gazepoint'] = [host, port]
+        tracker = connections.get('tobii')
+        if tracker is not None:
+            print(f"✅ Connected to Tobii: {tracker.model}")
+            self.cache['tobii_address'] = tracker.address
+        save_cache(self.cache, self.cache_path)
+        return connections
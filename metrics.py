@@ -0,0 +1,190 @@
+import json
+import statistics
+import time
+
+HISTOGRAM_BIN_MS = 0.25
+HISTOGRAM_MAX_MS = 100.0
+GAP_FACTOR = 1.5          # an interval this many times the nominal one is a gap
+LATENCY_WINDOW_S = 10.0   # baseline offset for latency is the minimum over this window
+RATE_WINDOW_S = 1.0
+RATE_ESTIMATE_INTERVALS = 50  # intervals whose median gives the rate when the device does not report it
+
+DEVICE_TIME_TO_S = {'tobii': 1e-6, 'gazepoint': 1.0}
+
+
+class DeviceMetrics:
+    """Sample rate, interval histogram, gaps and receive latency for one device.
+
+    update() does a handful of arithmetic operations and no allocation, so it
+    can run for every sample in the consumer/reader threads. Latency is the
+    host receive time minus the device time, relative to the smallest such
+    offset seen in the last LATENCY_WINDOW_S, i.e. the delay on top of the
+    fastest delivery.
+
+    Gaps and drops are counted against nominal_rate_hz, the rate the device
+    is set to (Tobii: get_gaze_output_frequency()). Without it, or until
+    set_nominal_rate() is called, the rate is estimated from the median of
+    the first RATE_ESTIMATE_INTERVALS sample intervals, and those intervals
+    are checked for gaps once it is known.
+    """
+
+    def __init__(self, name, nominal_rate_hz=None, device_time_to_s=None):
+        self.name = name
+        self.nominal_rate_hz = None
+        self.device_time_to_s = device_time_to_s or DEVICE_TIME_TO_S[name]
+        self.samples = 0
+        self.gaps = 0
+        self.dropped = 0
+        self.longest_gap_ms = 0.0
+        self.histogram = [0] * (int(HISTOGRAM_MAX_MS / HISTOGRAM_BIN_MS) + 1)
+        self.latency_histogram = [0] * (int(HISTOGRAM_MAX_MS / HISTOGRAM_BIN_MS) + 1)
+        self.max_latency_ms = 0.0
+        self.queue_depth = None
+        self.max_queue_depth = 0
+        self._gap_s = None
+        self._pending_intervals = []
+        if nominal_rate_hz:
+            self.set_nominal_rate(nominal_rate_hz)
+        self._first_device_s = None
+        self._last_device_s = None
+        self._min_offset = self._previous_min_offset = float('inf')
+        self._offset_window_end = None
+        self._rate_window_start = None
+        self._rate_window_count = 0
+        self.recent_rate_hz = 0.0
+
+    def set_nominal_rate(self, rate_hz):
+        self.nominal_rate_hz = float(rate_hz)
+        self._gap_s = GAP_FACTOR / self.nominal_rate_hz
+        pending, self._pending_intervals = self._pending_intervals, []
+        for interval in pending:
+            self._check_gap(interval)
+
+    def _estimate_rate(self):
+        positive = [interval for interval in self._pending_intervals if interval > 0]
+        if positive:
+            self.set_nominal_rate(1.0 / statistics.median(positive))
+
+    def _check_gap(self, interval):
+        if interval > self._gap_s:
+            self.gaps += 1
+            self.dropped += max(0, round(interval * self.nominal_rate_hz) - 1)
+            if interval * 1e3 > self.longest_gap_ms:
+                self.longest_gap_ms = interval * 1e3
+
+    def update(self, device_time, host_ns):
+        device_s = device_time * self.device_time_to_s
+        host_s = host_ns * 1e-9
+        last = self._last_device_s
+        self.samples += 1
+        if last is None:
+            self._first_device_s = device_s
+            self._offset_window_end = host_s + LATENCY_WINDOW_S
+            self._rate_window_start = host_s
+        else:
+            interval = device_s - last
+            interval_ms = interval * 1e3
+            if interval_ms < HISTOGRAM_MAX_MS:
+                self.histogram[int(interval_ms / HISTOGRAM_BIN_MS) if interval_ms > 0 else 0] += 1
+            else:
+                self.histogram[-1] += 1
+            if self._gap_s is not None:
+                self._check_gap(interval)
+            else:
+                self._pending_intervals.append(interval)
+                if len(self._pending_intervals) >= RATE_ESTIMATE_INTERVALS:
+                    self._estimate_rate()
+        self._last_device_s = device_s
+
+        # Receive latency over the best recent delivery
+        offset = host_s - device_s
+        if host_s > self._offset_window_end:
+            self._previous_min_offset = self._min_offset
+            self._min_offset = offset
+            self._offset_window_end = host_s + LATENCY_WINDOW_S
+        elif offset < self._min_offset:
+            self._min_offset = offset
+        latency_ms = (offset - min(self._min_offset, self._previous_min_offset)) * 1e3
+        if latency_ms < HISTOGRAM_MAX_MS:
+            self.latency_histogram[int(latency_ms / HISTOGRAM_BIN_MS)] += 1
+        else:
+            self.latency_histogram[-1] += 1
+        if latency_ms > self.max_latency_ms:
+            self.max_latency_ms = latency_ms
+
+        self._rate_window_count += 1
+        elapsed = host_s - self._rate_window_start
+        if elapsed >= RATE_WINDOW_S:
+            self.recent_rate_hz = self._rate_window_count / elapsed
+            self._rate_window_start = host_s
+            self._rate_window_count = 0
+
+    def observe_queue(self, depth):
+        self.queue_depth = depth
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    @property
+    def effective_rate_hz(self):
+        if self.samples < 2:
+            return 0.0
+        duration = self._last_device_s - self._first_device_s
+        return (self.samples - 1) / duration if duration > 0 else 0.0
+
+    @staticmethod
+    def _percentile(histogram, q):
+        total = sum(histogram)
+        if not total:
+            return None
+        target = total * q / 100.0
+        running = 0
+        for i, count in enumerate(histogram):
+            running += count
+            if running >= target:
+                return (i + 0.5) * HISTOGRAM_BIN_MS
+        return HISTOGRAM_MAX_MS
+
+    def status(self):
+        """Short live status for the terminal."""
+        text = f"{self.name}: {self.samples} @ {self.recent_rate_hz:.0f} Hz"
+        if self.dropped:
+            text += f", {self.dropped} dropped"
+        if self.queue_depth:
+            text += f", queue {self.queue_depth}"
+        return text
+
+    def summary(self):
+        if self._gap_s is None:
+            self._estimate_rate()  # short recording: use what there is
+        expected = self.samples + self.dropped
+        return {
+            'device': self.name,
+            'samples': self.samples,
+            'nominal_rate_hz': self.nominal_rate_hz,
+            'effective_rate_hz': self.effective_rate_hz,
+            'gaps': self.gaps,
+            'dropped': self.dropped,
+            'drop_rate': self.dropped / expected if expected else 0.0,
+            'longest_gap_ms': self.longest_gap_ms,
+            'interval_ms': {f'p{q}': self._percentile(self.histogram, q) for q in (1, 50, 99)},
+            'latency_ms': {f'p{q}': self._percentile(self.latency_histogram, q) for q in (50, 95, 99)},
+            'max_latency_ms': self.max_latency_ms,
+            'max_queue_depth': self.max_queue_depth,
+            'histogram_bin_ms': HISTOGRAM_BIN_MS,
+            'interval_histogram': self.histogram,
+        }
+
+
+def write_summary(path, devices, **extra):
+    """Write the per-session metrics summary as JSON next to the data files.
+
+    devices are DeviceMetrics or their summary() dicts (as sent back by
+    acquisition worker processes); None entries are skipped.
+    """
+    summaries = [device if isinstance(device, dict) else device.summary()
+                 for device in devices if device is not None]
+    summary = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), **extra,
+               'devices': {device['device']: device for device in summaries}}
+    with open(path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
@@ -1,19 +1,19 @@
-from psychopy import visual, core, event
-import tobii_research as tr
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
 import random
-from PIL import Image
+import time
+from launcher import DeviceConnector
 
-eye_trackers = tr.find_all_eyetrackers()
-if not eye_trackers:
+# Look for the eye tracker (cached address first) while PsychoPy loads;
+# analysis modules are imported once recording is over
+connector = DeviceConnector(devices=('tobii',))
+from psychopy import visual, core
+import tobii_research as tr
+from stimulus_manager import StimulusManager
+
+eye_tracker = connector.result()['tobii']  # first available eye tracker
+if eye_tracker is None:
     print("No eye tracker found!")
     core.quit()
 
-eye_tracker = eye_trackers[0]  # first available eye tracker
-
 # initialize psychopy window
 win = visual.Window(size=[1536, 864], fullscr=True, color="Gray", units="pix", waitBlanking=True)
 
@@ -25,10 +25,12 @@ stimuli = [
     {"type": "image", "content": "face.jpg", "name": "Image_1"},
     {"type": "image", "content": "beach.jpg", "name": "Image_2"}
 ]
+# Preload all stimuli before presenting them
+stimulus_manager = StimulusManager(win, stimuli)
 
 def gaze_data_callback(gaze_data):
-    """Logs gaze data in real-time and assigns current stimulus."""
-    global gaze_data_list, current_stimulus
+    """Logs gaze data in real-time; stimuli are assigned from the flip log at save time."""
+    global gaze_data_list
 
     timestamp = core.Clock()
     left_gaze = gaze_data.get("left_gaze_point_on_display_area")
@@ -41,8 +43,8 @@ def gaze_data_callback(gaze_data):
         left_x, left_y = left_gaze
         right_x, right_y = right_gaze
 
-        # Store gaze data with current stimulus name
         gaze_data_list.append({
+            "host_ns": time.perf_counter_ns(),
             "Timestamp": timestamp.getTime(),
             "Left Gaze X": left_x,
             "Left Gaze Y": left_y,
@@ -50,7 +52,6 @@ def gaze_data_callback(gaze_data):
             "Right Gaze Y": right_y,
             "Left Gaze Validity": left_point_validity,
             "Right Gaze Validity": right_point_validity,
-            "Event Flag": current_stimulus
         })
 
 # Subscribe to gaze data stream
@@ -59,27 +60,25 @@ eye_tracker.subscribe_to(tr.EYETRACKER_GAZE_DATA, gaze_data_callback, as_diction
 # Present stimuli in random order
 random.shuffle(stimuli)
 for stimulus in stimuli:
-    current_stimulus = stimulus["name"]  # Track current stimulus name
-
-    if stimulus["type"] == "text":
-        text_stimulus = visual.TextStim(win, text=stimulus["content"], color="black", pos=(0, 0), height=40)
-        text_stimulus.draw()
-    elif stimulus["type"] == "image":
-        image_stimulus = visual.ImageStim(win, image=stimulus["content"], pos=(0, 0), size=(800, 600))
-        image_stimulus.draw()
-
-    win.flip()
-
-    # Wait for space key press to exit the stimulus
-    event.waitKeys(keyList=["space"])
-     
+    # Show until space key press to exit the stimulus
+    stimulus_manager.present_until_key(stimulus["name"], keys=["space"])
+stimulus_manager.clear()
+stimulus_manager.write_log("stimulus_log.csv")
 
 # Stop data collection
 eye_tracker.unsubscribe_from(tr.EYETRACKER_GAZE_DATA, gaze_data_callback)
 
+import pandas as pd
+import numpy as np
+from fixations import classify_idt
+from heatmaps import DensityCache, SIGMA_DEG, fixation_density, render_heatmaps, screen_to_image
+from session_file import SessionFile, write_session
+
 # Save gaze data to a CSV file
 if gaze_data_list:
     df = pd.DataFrame(gaze_data_list)
+    # Stimulus on screen when each sample arrived, by flip-locked onset
+    df["Event Flag"] = stimulus_manager.labels(df.pop("host_ns").to_numpy())
     df.to_csv("gaze_data.csv", index=False)
 else:
     print("No gaze data recorded!")
@@ -102,85 +101,41 @@ df['y_avg'] = (df['Left Gaze Y'] + df['Right Gaze Y']) / 2
 window_size = 40 # Number of frames in the sliding window
 dispersion_threshold = 0.05 # Pixels (adjusted for 1536x864 screen)
 
-# Initialize classification column
-df['Movement'] = 'saccade'
-
 # Apply I-DT algorithm
-for i in range(len(df) - window_size):
-    window_x = df['x_avg'].iloc[i : i + window_size]
-    window_y = df['y_avg'].iloc[i : i + window_size]
-
-    dispersion = (window_x.max() - window_x.min()) + (window_y.max() - window_y.min())
-
-    if dispersion < dispersion_threshold:
-        df.loc[i : i + window_size, 'Movement'] = 'fixation'
+df['Movement'] = classify_idt(df['x_avg'].to_numpy(), df['y_avg'].to_numpy(),
+                              dispersion_threshold, window_size=window_size)
 
 # Save the classified dataset
 df.to_csv("classified_gaze_data.csv", index=False)
+write_session(df, "classified_gaze_data.gzs")
 
 ##############################################
 ######## create heatmap of fixation ##########
 ##############################################
 
+session = SessionFile("classified_gaze_data.gzs")
+heatmap_cache = DensityCache()
+heatmap_items = []
 for stimulus in stimuli:
     if stimulus["type"] == "image":
         stimulus_name = stimulus["name"]
-        stimulus_file = stimulus["content"]
-
-        # Load eye-tracking data
-        df = pd.read_csv("classified_gaze_data.csv")
-
-        # Filter only fixations during the stimulus presentation
-        mask = (df["Event Flag"] == stimulus_name) & (df["Movement"] == "fixation") & (df["Left Gaze Validity"] == 1) & (df["Right Gaze Validity"] == 1)
-        fixations = df[mask]
-
-        # Remove missing data
-        fixations = fixations.dropna(subset=["Left Gaze X", "Left Gaze Y", "Right Gaze X", "Right Gaze Y"])
-
-        # Screen and image parameters
-        SCREEN_WIDTH, SCREEN_HEIGHT = 1536, 864  # Screen resolution
-        IMAGE_X, IMAGE_Y = 368, 132
-        IMAGE_WIDTH, IMAGE_HEIGHT = 800, 600  # Image dimensions on the screen
-
-        # Load the stimulus image
-        stimulus_img = Image.open(stimulus_file)
-
-        # Convert gaze coordinates from screen to image
-        fixations["Left Gaze X"] = fixations["Left Gaze X"] * SCREEN_WIDTH
-        fixations["Left Gaze Y"] = (1 - fixations["Left Gaze Y"]) * SCREEN_HEIGHT  # Flip Y-axis
-
-        fixations["Right Gaze X"] = fixations["Right Gaze X"] * SCREEN_WIDTH
-        fixations["Right Gaze Y"] = (1 - fixations["Right Gaze Y"]) * SCREEN_HEIGHT  # Flip Y-axis
-
-        # Filter only fixations within the image
-        fixations = fixations[
-            (fixations["Left Gaze X"] >= IMAGE_X) & (fixations["Left Gaze X"] <= IMAGE_X + IMAGE_WIDTH) &
-            (fixations["Left Gaze Y"] >= IMAGE_Y) & (fixations["Left Gaze Y"] <= IMAGE_Y + IMAGE_HEIGHT)
-        ]
-
-        # Convert coordinates relative to the image
-        fixations["Image Gaze X"] = fixations["Left Gaze X"] - IMAGE_X
-        fixations["Image Gaze Y"] = fixations["Left Gaze Y"] - IMAGE_Y
-
-        # Combine data from both eyes
-        gaze_x = np.concatenate([fixations["Image Gaze X"], fixations["Right Gaze X"] - IMAGE_X])
-        gaze_y = np.concatenate([fixations["Image Gaze Y"], fixations["Right Gaze Y"] - IMAGE_Y])
 
-        # Create the heatmap
-        plt.figure(figsize=(8, 6))
-        sns.kdeplot(x=gaze_x, y=gaze_y, cmap="Reds", fill=True, alpha=0.6)
+        def compute_density():
+            # Filter only fixations during the stimulus presentation
+            samples = session.stimulus_frame(stimulus_name)
+            mask = (samples["Movement"] == "fixation") & (samples["Left Gaze Validity"] == 1) & (samples["Right Gaze Validity"] == 1)
+            fixations = samples[mask].dropna(subset=["Left Gaze X", "Left Gaze Y", "Right Gaze X", "Right Gaze Y"])
 
-        # Overlay the stimulus image
-        plt.imshow(stimulus_img, extent=[0, IMAGE_WIDTH, 0, IMAGE_HEIGHT], aspect='auto')
+            # Convert gaze coordinates from screen to image and combine data from both eyes
+            left_x, left_y = screen_to_image(fixations["Left Gaze X"], fixations["Left Gaze Y"])
+            right_x, right_y = screen_to_image(fixations["Right Gaze X"], fixations["Right Gaze Y"])
+            return fixation_density(np.concatenate([left_x, right_x]), np.concatenate([left_y, right_y]))
 
-        # Formatting
-        plt.xlabel("X (pixel)")
-        plt.ylabel("Y (pixel)")
-        plt.title(f"Heatmap Fixations for {stimulus_name}")
+        density = heatmap_cache.get("classified_gaze_data.gzs", stimulus_name, {"sigma_deg": SIGMA_DEG}, compute_density)
+        heatmap_items.append((stimulus_name, stimulus["content"], density))
 
-        # Save and show
-        plt.savefig(f"fixation_heatmap_{stimulus_name}.png", dpi=300)
-        plt.show()
+# Save all heatmaps in one batch
+render_heatmaps(heatmap_items)
 
 
 '''
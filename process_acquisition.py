@@ -0,0 +1,409 @@
+import multiprocessing as mp
+import socket
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from sample_store import GAZEPOINT_SCHEMA, HOST_FIELDS, TOBII_SCHEMA
+
+RING_CAPACITY = 1 << 17   # records per device, about 3.6 minutes of Tobii data at 600 Hz
+POLL_INTERVAL = 0.005     # seconds between drains of the rings in the experiment process
+CONTROL_TIMEOUT = 10.0    # seconds to wait for a worker to stop
+CONNECT_TIMEOUT = 30.0    # seconds to wait for a worker to connect, covers the launcher's retries
+SOCKET_TIMEOUT = 0.05     # Gazepoint recv timeout, bounds how late control messages are seen
+
+# Header slots (int64) in front of the records
+HEAD, TAIL, DROPPED, STIMULUS, FIXATING = range(5)
+HEADER_BYTES = 64
+
+GAZEPOINT_ENABLE = (
+    '<SET ID="ENABLE_SEND_POG_FIX" STATE="1" />',
+    '<SET ID="ENABLE_SEND_TIME" STATE="1" />',
+    '<SET ID="ENABLE_SEND_EYE_LEFT" STATE="1" />',
+    '<SET ID="ENABLE_SEND_EYE_RIGHT" STATE="1" />',
+    '<SET ID="ENABLE_SEND_POG_LEFT" STATE="1" />',
+    '<SET ID="ENABLE_SEND_POG_RIGHT" STATE="1" />',
+)
+
+
+def record_dtype(schema):
+    """Fixed record layout: host stamp, stimulus code, then the device fields.
+
+    system_time_now is not stored; the experiment process derives it from
+    host_ns with its HostClock (perf_counter_ns is system-wide, so stamps
+    from the workers are on the same clock).
+    """
+    fields = [('host_ns', np.int64), ('stimulus', np.int16)]
+    fields += [(name, np.dtype(typecode)) for name, typecode in schema[HOST_FIELDS:]]
+    return np.dtype(fields)
+
+
+class SharedRing:
+    """Single-producer/single-consumer ring of fixed-layout records in shared memory.
+
+    The producer writes a record, then publishes it by moving HEAD; the
+    consumer reads up to HEAD and frees slots by moving TAIL. Neither side
+    takes a lock. STIMULUS is written by the experiment process and read by
+    the producer for every sample, so label changes need no message.
+    """
+
+    def __init__(self, dtype, capacity=RING_CAPACITY, name=None):
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        size = HEADER_BYTES + capacity * self.dtype.itemsize
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.name = self.shm.name
+        self.header = np.ndarray((HEADER_BYTES // 8,), dtype=np.int64, buffer=self.shm.buf)
+        self.records = np.ndarray((capacity,), dtype=self.dtype, buffer=self.shm.buf, offset=HEADER_BYTES)
+        if self.owner:
+            self.header[:] = 0
+
+    def __len__(self):
+        return int(self.header[HEAD] - self.header[TAIL])
+
+    def push(self, values):
+        header = self.header
+        head = int(header[HEAD])
+        if head - int(header[TAIL]) >= self.capacity:
+            header[DROPPED] += 1
+            return False
+        self.records[head % self.capacity] = values
+        header[HEAD] = head + 1
+        return True
+
+    def peek(self):
+        """Zero-copy views of every unread record (two when the ring wraps).
+
+        The slots stay reserved until advance() is called.
+        """
+        tail, head = int(self.header[TAIL]), int(self.header[HEAD])
+        if tail == head:
+            return []
+        start, end = tail % self.capacity, head % self.capacity
+        if start < end:
+            return [self.records[start:end]]
+        return [self.records[start:], self.records[:end]]
+
+    def advance(self, count):
+        self.header[TAIL] += count
+
+    def close(self):
+        # Views into the buffer must go before the mapping can be closed
+        del self.header, self.records
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _control_loop(conn, handlers, idle):
+    """Serve control messages until 'stop'; idle() runs between polls."""
+    while True:
+        if conn.poll(0 if idle else None):
+            message = conn.recv()
+            if message[0] == 'stop':
+                return
+            handler = handlers.get(message[0])
+            if handler is not None:
+                handler(*message[1:])
+        elif idle:
+            idle()
+
+
+def gazepoint_worker(conn, ring_name, capacity, host, port):
+    """Worker process: Gazepoint socket -> shared ring.
+
+    Like the Tobii worker, it runs an online fixation detector and
+    publishes its state in the FIXATING header slot.
+    """
+    from fixations import OnlineFixationDetector
+    from gazepoint_stream import GazepointStream
+    from launcher import connect_gazepoint
+    from metrics import DeviceMetrics
+
+    ring = SharedRing(record_dtype(GAZEPOINT_SCHEMA), capacity, ring_name)
+    try:
+        sock = connect_gazepoint(host, port)
+    except ConnectionError as e:
+        conn.send(('error', f"cannot connect to {e}"))
+        ring.close()
+        return
+    conn.send(('ready', f"Gazepoint API at {host}:{port}", [host, port]))
+    sock.settimeout(SOCKET_TIMEOUT)
+    for cmd in GAZEPOINT_ENABLE:
+        sock.send(str.encode(cmd + '\r\n'))
+
+    stream = GazepointStream(sock)
+    metrics = DeviceMetrics('gazepoint')
+    detector = OnlineFixationDetector(mode='idt')
+    push, now = ring.push, time.perf_counter_ns
+
+    def read():
+        try:
+            samples = stream.read()
+        except socket.timeout:
+            return
+        stamp = now()
+        stimulus = int(ring.header[STIMULUS])
+        for sample in samples:
+            push((stamp, stimulus) + sample)
+            device_time, left_x, left_y, _, left_valid, right_x, right_y, _, right_valid = sample
+            metrics.update(device_time, stamp)
+            detector.update_binocular(device_time, left_x, left_y, right_x, right_y, left_valid, right_valid)
+        ring.header[FIXATING] = detector.fixating
+
+    def user_event(value):
+        sock.send(str.encode(f'<SET ID="USER_EVENT" VALUE="{value}" />\r\n'))
+
+    handlers = {
+        'start': lambda: sock.send(b'<SET ID="ENABLE_SEND_DATA" STATE="1" />\r\n'),
+        'user_event': user_event,
+    }
+    try:
+        # Wait for 'start' without reading, then stream until 'stop'
+        message = conn.recv()
+        if message[0] == 'start':
+            handlers['start']()
+            _control_loop(conn, handlers, read)
+        sock.send(b'<SET ID="ENABLE_SEND_DATA" STATE="0" />\r\n')
+    except OSError as e:
+        conn.send(('error', f"Gazepoint connection lost: {e}"))
+        conn.recv()
+    finally:
+        sock.close()
+        conn.send(('stopped', metrics.summary()))
+        ring.close()
+
+
+def tobii_worker(conn, ring_name, capacity, address=None, fake_rate_hz=None):
+    """Worker process: Tobii SDK callbacks -> shared ring.
+
+    fake_rate_hz runs simulators.FakeEyeTracker instead of the SDK.
+    The online fixation detector runs here too and publishes its state in
+    the FIXATING header slot.
+    """
+    from fixations import OnlineFixationDetector
+    from launcher import gaze_output_frequency
+    from metrics import DeviceMetrics
+    from tobii_convert import gaze_sample
+
+    ring = SharedRing(record_dtype(TOBII_SCHEMA), capacity, ring_name)
+    try:
+        if fake_rate_hz:
+            from simulators import FakeEyeTracker, GAZE_DATA
+            tracker = FakeEyeTracker(rate_hz=fake_rate_hz)
+        else:
+            import tobii_research as tr
+            from launcher import connect_tobii
+            GAZE_DATA = tr.EYETRACKER_GAZE_DATA
+            tracker = connect_tobii(address)
+    except Exception as e:
+        conn.send(('error', f"cannot connect to Tobii: {e}"))
+        ring.close()
+        return
+    conn.send(('ready', f"Tobii: {tracker.model}", tracker.address))
+
+    metrics = DeviceMetrics('tobii', gaze_output_frequency(tracker))
+    detector = OnlineFixationDetector(mode='idt')
+    push, now = ring.push, time.perf_counter_ns
+
+    def callback(gaze_data):
+        stamp = now()
+        sample = gaze_sample(gaze_data)
+        push((stamp, int(ring.header[STIMULUS])) + sample)
+        device_time, left_x, left_y, _, left_valid, right_x, right_y, _, right_valid = sample
+        metrics.update(device_time, stamp)
+        detector.update_binocular(device_time / 1e6, left_x, left_y, right_x, right_y, left_valid, right_valid)
+        ring.header[FIXATING] = detector.fixating
+
+    subscribed = False
+    try:
+        message = conn.recv()
+        if message[0] == 'start':
+            tracker.subscribe_to(GAZE_DATA, callback, as_dictionary=True)
+            subscribed = True
+            _control_loop(conn, {}, None)
+    finally:
+        if subscribed:
+            tracker.unsubscribe_from(GAZE_DATA, callback)
+        conn.send(('stopped', metrics.summary()))
+        ring.close()
+
+
+class TrackerProcess:
+    """One tracker in its own worker process, feeding a SharedRing.
+
+    connect() starts the worker and waits until it reports the device as
+    connected; start()/stop() begin and end streaming. Records are drained
+    from self.ring in the experiment process.
+    """
+
+    def __init__(self, name, schema, target, *args, capacity=RING_CAPACITY):
+        self.name = name
+        self.schema = schema
+        self.ring = SharedRing(record_dtype(schema), capacity)
+        self.conn, child = mp.Pipe()
+        self.process = mp.Process(target=target, args=(child, self.ring.name, capacity) + args,
+                                  name=f'{name}-acquisition', daemon=True)
+        self.summary = None
+        self.address = None
+
+    def _reply(self, timeout=CONTROL_TIMEOUT):
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"{self.name} worker did not answer within {timeout} s")
+        return self.conn.recv()
+
+    def launch(self):
+        """Start the worker, which begins connecting to its device."""
+        self.process.start()
+
+    def wait_connected(self, timeout=CONNECT_TIMEOUT):
+        """Returns the worker's description of the device or raises ConnectionError."""
+        kind, detail, *address = self._reply(timeout)
+        if kind != 'ready':
+            self.process.join(CONTROL_TIMEOUT)
+            raise ConnectionError(detail)
+        self.address = address[0] if address else None
+        return detail
+
+    def start(self):
+        self.conn.send(('start',))
+
+    def set_stimulus(self, code):
+        self.ring.header[STIMULUS] = code
+
+    def user_event(self, value):
+        self.conn.send(('user_event', value))
+
+    @property
+    def fixating(self):
+        return bool(self.ring.header[FIXATING])
+
+    @property
+    def dropped(self):
+        return int(self.ring.header[DROPPED])
+
+    def stop(self, timeout=CONTROL_TIMEOUT):
+        """Stop streaming and return the worker's DeviceMetrics summary."""
+        if self.process.is_alive():
+            try:
+                self.conn.send(('stop',))
+                while True:
+                    kind, detail = self._reply(timeout)
+                    if kind == 'stopped':
+                        self.summary = detail
+                        break
+                    print(f"\n❌ {self.name}: {detail}")
+            except (TimeoutError, EOFError, OSError):
+                self.process.terminate()
+        self.process.join(timeout)
+        return self.summary
+
+    def close(self):
+        self.ring.close()
+
+
+class ProcessAcquisition(threading.Thread):
+    """Gazepoint and Tobii acquisition in worker processes.
+
+    The experiment process only runs this thread, which every POLL_INTERVAL
+    copies whatever the workers published into the SampleStores with one
+    bulk copy per column, so per-sample Python work never competes with the
+    render loop for the GIL. Stimulus labels go to the workers through the
+    ring headers; USER_EVENT markers through the Gazepoint control pipe.
+    """
+
+    def __init__(self, stores, clock, gazepoint=('127.0.0.1', 4242), tobii_address=None,
+                 fake_tobii_hz=None, capacity=RING_CAPACITY, poll_interval=POLL_INTERVAL):
+        super().__init__(daemon=True)
+        self.stores = stores  # {'gazepoint': SampleStore, 'tobii': SampleStore}
+        self.clock = clock
+        self.poll_interval = poll_interval
+        self.trackers = {
+            'gazepoint': TrackerProcess('gazepoint', GAZEPOINT_SCHEMA, gazepoint_worker, *gazepoint,
+                                        capacity=capacity),
+            'tobii': TrackerProcess('tobii', TOBII_SCHEMA, tobii_worker, tobii_address, fake_tobii_hz,
+                                    capacity=capacity),
+        }
+        self._stop_event = threading.Event()
+
+    def launch(self):
+        """Start the workers; they connect to their devices concurrently."""
+        # Samples before the first set_stimulus() are labelled 'none', as in
+        # threads mode; the ring's STIMULUS slot must hold a registered code
+        self.set_stimulus('none')
+        for tracker in self.trackers.values():
+            tracker.launch()
+
+    def wait_connected(self):
+        """Wait for both workers; raises ConnectionError (after cleaning up) if one failed."""
+        try:
+            for tracker in self.trackers.values():
+                print(f"✅ Connected to {tracker.wait_connected()}")
+        except (ConnectionError, TimeoutError):
+            for tracker in self.trackers.values():
+                tracker.stop()
+                tracker.close()
+            raise
+
+    def connect(self):
+        self.launch()
+        self.wait_connected()
+
+    def start(self):
+        super().start()
+        for tracker in self.trackers.values():
+            tracker.start()
+
+    def set_stimulus(self, stimulus):
+        for name, tracker in self.trackers.items():
+            tracker.set_stimulus(self.stores[name].register_stimulus(stimulus))
+
+    def user_event(self, value):
+        self.trackers['gazepoint'].user_event(value)
+
+    @property
+    def fixating(self):
+        return self.trackers['tobii'].fixating
+
+    def _drain(self):
+        for name, tracker in self.trackers.items():
+            store, ring = self.stores[name], tracker.ring
+            views = ring.peek()
+            for view in views:
+                system_time_now = self.clock.to_epoch_ms(view['host_ns'])
+                columns = [system_time_now, view['host_ns']]
+                columns += [view[field] for field, _ in store.schema[HOST_FIELDS:]]
+                store.extend_coded(columns, view['stimulus'])
+            ring.advance(sum(len(view) for view in views))
+
+    def run(self):
+        while not self._stop_event.wait(self.poll_interval):
+            self._drain()
+
+    def status(self):
+        parts = []
+        for name, tracker in self.trackers.items():
+            text = f"{name}: {len(self.stores[name])}"
+            if tracker.dropped:
+                text += f", {tracker.dropped} dropped"
+            if tracker.fixating:
+                text += ", fixating"
+            parts.append(text)
+        return ' | '.join(parts)
+
+    def close(self):
+        """Stop the workers, store the remaining records and free the rings.
+
+        Returns {device: DeviceMetrics summary} as reported by the workers.
+        """
+        summaries = {name: tracker.stop() for name, tracker in self.trackers.items()}
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        self._drain()
+        for tracker in self.trackers.values():
+            tracker.close()
+        return summaries
@@ -0,0 +1,220 @@
+import json
+import struct
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# Append-only binary chunk format:
+#   MAGIC, then any number of  b'CHNK' + u32 header length + JSON header + column bytes,
+#   closed by  b'FOOT' + u32 length + JSON footer + u64 footer offset + END_MAGIC.
+# Every chunk header carries the categories known so far, so a file without a
+# footer (crash, power loss) is still fully readable.
+MAGIC = b'GZCHUNK1'
+END_MAGIC = b'GZCEND'
+CHUNK_TAG = b'CHNK'
+FOOTER_TAG = b'FOOT'
+
+EXTENSIONS = {'csv': 'csv', 'binary': 'gzc', 'parquet': 'parquet', 'archive': 'gza'}
+
+FLUSH_INTERVAL = 0.5  # seconds
+ARCHIVE_CHUNK_INTERVAL = 5.0  # seconds of samples per chunk of a live archive
+
+
+class _CsvSink:
+    # The header is written on open, so a recording without samples still loads
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', newline='')
+        pd.DataFrame(columns=columns).to_csv(self.file, index=False)
+        self.file.flush()
+
+    def write(self, frame):
+        frame.to_csv(self.file, index=False, header=False)
+        self.file.flush()
+
+    def close(self, rows, categories):
+        self.file.close()
+
+
+class _BinarySink:
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.offsets = []
+
+    def write(self, frame):
+        stimulus = frame['stimulus'].array
+        columns = [name for name in frame.columns if name != 'stimulus']
+        header = json.dumps({
+            'rows': len(frame),
+            'columns': [[name, frame[name].dtype.str] for name in columns],
+            'categories': list(stimulus.categories),
+        }).encode()
+        self.offsets.append(self.file.tell())
+        self.file.write(CHUNK_TAG + struct.pack('<I', len(header)) + header)
+        for name in columns:
+            self.file.write(np.ascontiguousarray(frame[name].to_numpy()).tobytes())
+        self.file.write(np.ascontiguousarray(stimulus.codes, dtype='<i2').tobytes())
+        self.file.flush()
+
+    def close(self, rows, categories):
+        footer = json.dumps({'rows': rows, 'chunks': self.offsets,
+                             'categories': categories}).encode()
+        offset = self.file.tell()
+        self.file.write(FOOTER_TAG + struct.pack('<I', len(footer)) + footer)
+        self.file.write(struct.pack('<Q', offset) + END_MAGIC)
+        self.file.close()
+
+
+class _ParquetSink:
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("the parquet format needs pyarrow (pip install pyarrow)") from e
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        self.writer = None
+
+    def write(self, frame):
+        # Store labels rather than codes, dictionary-encoded by parquet itself
+        frame = frame.assign(stimulus=frame['stimulus'].astype(str))
+        table = self.pa.Table.from_pandas(frame, preserve_index=False)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self, rows, categories):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class _ArchiveSink:
+    # Buffered rows are written as a chunk at least every chunk_interval, so a
+    # crash loses at most that much and memory stays bounded. Chunks of a few
+    # thousand rows compress nearly as well as the full CHUNK_ROWS ones that
+    # archive.convert() writes offline.
+    def __init__(self, path, chunk_interval=ARCHIVE_CHUNK_INTERVAL):
+        from archive import ArchiveWriter
+        self.writer = ArchiveWriter(path)
+        self.chunk_interval = chunk_interval
+        self._last_chunk = time.monotonic()
+
+    def write(self, frame):
+        self.writer.write(frame)
+        now = time.monotonic()
+        if now - self._last_chunk >= self.chunk_interval:
+            self.writer.flush()
+            self._last_chunk = now
+
+    def close(self, rows, categories):
+        self.writer.close()
+
+
+_SINKS = {'csv': _CsvSink, 'binary': _BinarySink, 'parquet': _ParquetSink, 'archive': _ArchiveSink}
+
+
+def read_binary(path):
+    """Load a binary chunk file as a DataFrame, with or without its footer."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a binary recording")
+
+    frames = []
+    codes = []
+    categories = []
+    pos = len(MAGIC)
+    while data[pos:pos + 4] == CHUNK_TAG:
+        (length,) = struct.unpack_from('<I', data, pos + 4)
+        pos += 8
+        if pos + length > len(data):
+            break
+        header = json.loads(data[pos:pos + length])
+        pos += length
+        rows = header['rows']
+        dtypes = [(name, np.dtype(dtype)) for name, dtype in header['columns']]
+        if pos + rows * (sum(dtype.itemsize for _, dtype in dtypes) + 2) > len(data):
+            break  # chunk cut short by a crash
+
+        columns = {}
+        for name, dtype in dtypes:
+            columns[name] = np.frombuffer(data, dtype, rows, pos)
+            pos += rows * dtype.itemsize
+        codes.append(np.frombuffer(data, '<i2', rows, pos))
+        pos += rows * 2
+        categories = header['categories']
+        frames.append(pd.DataFrame(columns, copy=False))
+
+    if not frames:
+        return pd.DataFrame()
+    # Categories only ever grow, so the last chunk's list decodes every chunk
+    frame = pd.concat(frames, ignore_index=True)
+    frame['stimulus'] = pd.Categorical.from_codes(np.concatenate(codes), categories)
+    return frame
+
+
+class RecordingWriter(threading.Thread):
+    """Background thread that streams a SampleStore to disk while recording.
+
+    Every flush_interval seconds the store's open chunk is sealed and all
+    sealed chunks are written and dropped from memory, so memory stays
+    bounded by one interval of samples. close() only writes what arrived
+    since the last flush and the format's footer.
+
+    stimulus_labels(host_ns) -> Categorical, e.g. StimulusManager.labels,
+    replaces the stored stimulus column at write time, so samples are
+    assigned by flip time rather than by when they were received.
+    """
+
+    def __init__(self, store, path, fmt='csv', flush_interval=FLUSH_INTERVAL, stimulus_labels=None):
+        super().__init__(daemon=True)
+        if fmt not in _SINKS:
+            raise ValueError(f"unknown recording format {fmt!r}, expected one of {sorted(_SINKS)}")
+        self.store = store
+        self.path = path
+        self.fmt = fmt
+        self.flush_interval = flush_interval
+        self.stimulus_labels = stimulus_labels
+        self.rows_written = 0
+        self.categories = []
+        self.error = None
+        if fmt == 'csv':
+            self._sink = _CsvSink(path, [name for name, _ in store.schema] + ['stimulus'])
+        else:
+            self._sink = _SINKS[fmt](path)
+        self._stop_event = threading.Event()
+        self._write_lock = threading.Lock()
+
+    def flush(self):
+        """Write every sample collected so far."""
+        with self._write_lock:
+            self.store.seal()
+            for frame in self.store.pop_sealed():
+                if self.stimulus_labels is not None:
+                    frame['stimulus'] = self.stimulus_labels(frame['host_ns'].to_numpy())
+                self.categories = list(frame['stimulus'].cat.categories)
+                self._sink.write(frame)
+                self.rows_written += len(frame)
+
+    def run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self.error = e
+                print(f"\n❌ Writer error ({self.path}): {e}")
+                return
+
+    def close(self):
+        """Stop the thread, write the remaining samples and finalise the file."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        if self.error is None:
+            self.flush()
+        self._sink.close(self.rows_written, self.categories)
+        return self.rows_written
@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+
+# Engbert & Kliegl (2003) defaults
+LAMBDA = 6.0              # threshold multiplier of the median-based velocity SD
+MIN_DURATION = 0.006      # seconds
+MERGE_GAP = 0.010         # seconds; closer events are merged
+CHUNK_SIZE = 1_000_000    # samples per chunk
+OVERLAP = 1_000           # extra samples on each side of a chunk; longer events are cut
+THRESHOLD_SAMPLES = 1_000_000  # per segment and eye, velocities used for the median thresholds
+
+EVENT_COLUMNS = ['onset', 'offset', 'onset_time', 'offset_time', 'duration',
+                 'amplitude', 'peak_velocity', 'segment']
+
+
+def velocity(t, x):
+    """Moving-window (5-point) velocity of x over time t.
+
+    v[n] = (x[n+2] + x[n+1] - x[n-1] - x[n-2]) / (t[n+2] + t[n+1] - t[n-1] - t[n-2]),
+    which is the usual 6 * dt form for regular sampling. The first and last
+    two samples are NaN.
+    """
+    t = np.asarray(t, dtype=float)
+    x = np.asarray(x, dtype=float)
+    v = np.full(len(x), np.nan)
+    if len(x) >= 5:
+        dx = x[4:] + x[3:-1] - x[1:-3] - x[:-4]
+        dt = t[4:] + t[3:-1] - t[1:-3] - t[:-4]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            v[2:-2] = np.where(dt > 0, dx / dt, np.nan)
+    return v
+
+
+def _median_sd(v):
+    """Median-based SD: sqrt(median(v^2) - median(v)^2)."""
+    v = v[np.isfinite(v)]
+    if not len(v):
+        return np.nan
+    return np.sqrt(max(np.median(v * v) - np.median(v) ** 2, 0.0))
+
+
+def _runs(mask):
+    """Start and stop (exclusive) indices of the True runs in mask."""
+    edges = np.diff(np.concatenate([[0], mask.view(np.int8), [0]]))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def _merge(starts, stops, t, max_gap):
+    """Merge runs separated by at most max_gap seconds (runs sorted by start)."""
+    if len(starts) < 2:
+        return starts, stops
+    # Running maximum so overlapping runs merge as well
+    ends = np.maximum.accumulate(stops)
+    gaps = t[starts[1:]] - t[np.minimum(ends[:-1], len(t) - 1)]
+    new_group = np.concatenate([[True], (starts[1:] > ends[:-1]) & (gaps > max_gap)])
+    group_first = np.flatnonzero(new_group)
+    group_last = np.append(group_first[1:], len(starts)) - 1
+    return starts[group_first], ends[group_last]
+
+
+def _binocular(left, right):
+    """Union of left-eye and right-eye events that overlap in time."""
+    (ls, le), (rs, re) = left, right
+    if not len(ls) or not len(rs):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    first = np.searchsorted(re, ls, side='right')      # first right event ending after the left onset
+    last = np.searchsorted(rs, le, side='left') - 1    # last right event starting before the left offset
+    both = first <= last
+    starts = np.minimum(ls[both], rs[first[both]])
+    stops = np.maximum(le[both], re[last[both]])
+    order = np.argsort(starts, kind='stable')
+    return starts[order], stops[order]
+
+
+class _Thresholds:
+    """Per-segment, per-axis velocity thresholds eta = lambda * median SD."""
+
+    def __init__(self, lam):
+        self.lam = lam
+        self.samples = {}
+
+    def add(self, segments, codes, key, v, stride):
+        for code in segments:
+            selected = v[codes == code][::stride[code]]
+            self.samples.setdefault((code, key), []).append(selected.astype(np.float32))
+
+    def table(self, n_segments, key):
+        eta = np.full(n_segments, np.nan)
+        for code in range(n_segments):
+            parts = self.samples.get((code, key))
+            if parts:
+                eta[code] = self.lam * _median_sd(np.concatenate(parts).astype(float))
+        return eta
+
+
+def detect_saccades(t, left_x, left_y, right_x=None, right_y=None, segments=None,
+                    lam=LAMBDA, min_duration=MIN_DURATION, merge_gap=MERGE_GAP,
+                    chunk_size=CHUNK_SIZE, overlap=OVERLAP):
+    """Engbert-Kliegl saccade and microsaccade detection over a whole session.
+
+    t is in seconds and coordinates in any unit; velocities are in units/s.
+    Thresholds are computed separately for every segment label (e.g. the
+    stimulus column) and eye. With both eyes, only events present in both
+    eyes at overlapping times are kept (binocular criterion).
+
+    The session is processed in chunks of chunk_size samples, each extended by
+    overlap samples on both sides, so memory does not grow with session length.
+
+    Returns a DataFrame with one row per event: sample onset/offset (offset
+    inclusive), times, duration, amplitude (displacement of the mean gaze from
+    onset to offset), peak velocity and segment label.
+    """
+    t = np.asarray(t, dtype=float)
+    n = len(t)
+    eyes = [('left', left_x, left_y)]
+    if right_x is not None and right_y is not None:
+        eyes.append(('right', right_x, right_y))
+    eyes = [(name, np.asarray(x, dtype=float), np.asarray(y, dtype=float)) for name, x, y in eyes]
+
+    if segments is None:
+        codes = np.zeros(n, dtype=np.int64)
+        labels = np.array([None], dtype=object)
+    else:
+        codes, labels = pd.factorize(np.asarray(segments))
+    counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+    stride = np.maximum(1, -(-counts // THRESHOLD_SAMPLES))
+
+    def chunks():
+        for start in range(0, n, chunk_size):
+            lo, hi = max(0, start - overlap), min(n, start + chunk_size + overlap)
+            yield start, min(n, start + chunk_size), lo, hi
+
+    # Pass 1: velocity samples for the median-based thresholds
+    thresholds = _Thresholds(lam)
+    for start, stop, lo, hi in chunks():
+        # Only the chunk core contributes, so overlapping samples are not counted twice
+        core = slice(start - lo, stop - lo)
+        chunk_codes = codes[start:stop]
+        present = np.unique(chunk_codes[chunk_codes >= 0])
+        for name, x, y in eyes:
+            thresholds.add(present, chunk_codes, (name, 'x'), velocity(t[lo:hi], x[lo:hi])[core], stride)
+            thresholds.add(present, chunk_codes, (name, 'y'), velocity(t[lo:hi], y[lo:hi])[core], stride)
+    eta = {(name, axis): thresholds.table(len(labels), (name, axis)) for name, _, _ in eyes for axis in 'xy'}
+
+    # Pass 2: detection
+    mean_x = np.nanmean(np.stack([x for _, x, _ in eyes]), axis=0) if len(eyes) > 1 else eyes[0][1]
+    mean_y = np.nanmean(np.stack([y for _, _, y in eyes]), axis=0) if len(eyes) > 1 else eyes[0][2]
+    tables = []
+    for start, stop, lo, hi in chunks():
+        tt = t[lo:hi]
+        chunk_codes = codes[lo:hi]
+        valid_code = chunk_codes >= 0
+        runs = []
+        speed = np.zeros(hi - lo)
+        for name, x, y in eyes:
+            vx = velocity(tt, x[lo:hi])
+            vy = velocity(tt, y[lo:hi])
+            ex = np.where(valid_code, eta[(name, 'x')][chunk_codes], np.nan)
+            ey = np.where(valid_code, eta[(name, 'y')][chunk_codes], np.nan)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                # A motionless axis (eta 0) must not turn the whole criterion into NaN
+                outside = np.where(vx == 0, 0, vx / ex) ** 2 + np.where(vy == 0, 0, vy / ey) ** 2 > 1
+            starts, stops = _runs(outside)
+            keep = tt[stops - 1] - tt[starts] >= min_duration
+            runs.append(_merge(starts[keep], stops[keep], tt, merge_gap))
+            speed = np.fmax(speed, np.hypot(vx, vy))
+
+        starts, stops = runs[0] if len(runs) == 1 else _merge(*_binocular(*runs), tt, 0.0)
+        # Keep events that start inside the chunk core
+        core = (starts + lo >= start) & (starts + lo < stop)
+        starts, stops = starts[core], stops[core]
+        if not len(starts):
+            continue
+
+        onset = starts + lo
+        offset = stops - 1 + lo
+        # Events do not overlap, so interleaved start/stop bounds give every
+        # event's maximum at the even positions
+        bounds = np.column_stack([starts, stops]).ravel()
+        peak = np.maximum.reduceat(np.append(speed, 0.0), bounds)[::2]
+        tables.append(pd.DataFrame({
+            'onset': onset,
+            'offset': offset,
+            'onset_time': t[onset],
+            'offset_time': t[offset],
+            'duration': t[offset] - t[onset],
+            'amplitude': np.hypot(mean_x[offset] - mean_x[onset], mean_y[offset] - mean_y[onset]),
+            'peak_velocity': peak,
+            'segment': labels[codes[onset]] if segments is not None else None,
+        }))
+
+    if not tables:
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+    return pd.concat(tables, ignore_index=True)
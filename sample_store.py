@@ -0,0 +1,168 @@
+import threading
+from array import array
+
+import numpy as np
+
+# Column name -> array typecode, in CSV column order (stimulus is stored as a code).
+# The first HOST_FIELDS columns come from the host clock: epoch milliseconds and
+# the perf_counter_ns receive stamp, which is on the clock of the stimulus log.
+HOST_FIELDS = 2
+
+GAZEPOINT_SCHEMA = (
+    ('system_time_now', 'q'),
+    ('host_ns', 'q'),
+    ('device_time_stamp', 'd'),
+    ('left_gaze_x', 'd'),
+    ('left_gaze_y', 'd'),
+    ('left_pupil', 'd'),
+    ('left_validity', 'd'),
+    ('right_gaze_x', 'd'),
+    ('right_gaze_y', 'd'),
+    ('right_pupil', 'd'),
+    ('right_validity', 'd'),
+)
+
+TOBII_SCHEMA = (
+    ('system_time_now', 'q'),
+    ('host_ns', 'q'),
+    ('device_time_stamp', 'q'),
+    ('left_gaze_x', 'd'),
+    ('left_gaze_y', 'd'),
+    ('left_pupil', 'd'),
+    ('left_validity', 'b'),
+    ('right_gaze_x', 'd'),
+    ('right_gaze_y', 'd'),
+    ('right_pupil', 'd'),
+    ('right_validity', 'b'),
+)
+
+CHUNK_SIZE = 65536
+
+_DTYPES = {'q': np.int64, 'd': np.float64, 'b': np.int8, 'h': np.int16}
+
+
+def _as_numpy(buf, typecode):
+    """Zero-copy NumPy view of an array.array."""
+    if not len(buf):
+        return np.empty(0, dtype=_DTYPES[typecode])
+    return np.frombuffer(buf, dtype=_DTYPES[typecode])
+
+
+class SampleStore:
+    """Chunked columnar store for one device's samples.
+
+    Every column is a typed array.array, so a sample costs a few bytes per
+    field instead of a Python dict. The stimulus column holds int16 codes
+    into self.categories. Rows are collected in chunks of chunk_size, a
+    full chunk is sealed and never touched again.
+    """
+
+    def __init__(self, schema, chunk_size=CHUNK_SIZE):
+        self.schema = tuple(schema)
+        self.columns = tuple(name for name, _ in self.schema)
+        self.chunk_size = chunk_size
+        self.categories = []
+        self._codes = {}
+        self._sealed = []
+        self._lock = threading.Lock()
+        self._count = 0
+        self._new_chunk()
+
+    def _new_chunk(self):
+        self._current = [array(typecode) for _, typecode in self.schema]
+        self._current_stimulus = array('h')
+        self._appenders = [column.append for column in self._current]
+
+    def __len__(self):
+        return self._count
+
+    def stimulus_code(self, stimulus):
+        # Callers hold self._lock; other threads use register_stimulus()
+        code = self._codes.get(stimulus)
+        if code is None:
+            code = self._codes[stimulus] = len(self.categories)
+            self.categories.append(stimulus)
+        return code
+
+    def register_stimulus(self, stimulus):
+        """Code of stimulus for extend_coded(), adding it to the categories if new."""
+        with self._lock:
+            return self.stimulus_code(stimulus)
+
+    def append(self, row, stimulus):
+        """Append one sample; row holds the values in schema order."""
+        code = self._codes.get(stimulus)
+        with self._lock:
+            if code is None:
+                code = self.stimulus_code(stimulus)
+            for append, value in zip(self._appenders, row):
+                append(value)
+            self._current_stimulus.append(code)
+            self._count += 1
+            if len(self._current_stimulus) >= self.chunk_size:
+                self._seal()
+
+    def extend_coded(self, columns, codes):
+        """Append many samples from NumPy columns (schema order) and stimulus codes.
+
+        codes come from register_stimulus(). Each column is copied in with a
+        single frombytes(), with no per-sample Python work.
+        """
+        with self._lock:
+            for (_, typecode), buf, values in zip(self.schema, self._current, columns):
+                buf.frombytes(np.ascontiguousarray(values, dtype=_DTYPES[typecode]).tobytes())
+            self._current_stimulus.frombytes(np.ascontiguousarray(codes, dtype=np.int16).tobytes())
+            self._count += len(codes)
+            if len(self._current_stimulus) >= self.chunk_size:
+                self._seal()
+
+    def _seal(self):
+        self._sealed.append((self._current, self._current_stimulus))
+        self._new_chunk()
+
+    def seal(self):
+        """Seal the current chunk (if not empty) so it can be handed on."""
+        with self._lock:
+            if len(self._current_stimulus):
+                self._seal()
+
+    def pop_sealed(self):
+        """Remove and return the sealed chunks as DataFrames."""
+        with self._lock:
+            chunks, self._sealed = self._sealed, []
+            categories = list(self.categories)
+        return [self._chunk_frame(chunk, categories) for chunk in chunks]
+
+    def _chunk_frame(self, chunk, categories):
+        # pandas is imported here so acquisition starts without it
+        import pandas as pd
+
+        buffers, codes = chunk
+        data = {name: _as_numpy(buf, typecode)
+                for (name, typecode), buf in zip(self.schema, buffers)}
+        data['stimulus'] = pd.Categorical.from_codes(_as_numpy(codes, 'h'), categories)
+        return pd.DataFrame(data, copy=False)
+
+    def frame(self):
+        """All samples as one DataFrame.
+
+        The columns are zero-copy views of the store's buffers. If there is
+        more than one chunk they are first consolidated into a single one.
+        """
+        with self._lock:
+            # Buffers exported to NumPy cannot grow, so never hand out the open chunk
+            if len(self._current_stimulus):
+                self._seal()
+            chunks = self._sealed
+            if len(chunks) > 1:
+                merged = [array(typecode) for _, typecode in self.schema]
+                merged_stimulus = array('h')
+                for buffers, codes in chunks:
+                    for target, buf in zip(merged, buffers):
+                        target.extend(buf)
+                    merged_stimulus.extend(codes)
+                self._sealed = chunks = [(merged, merged_stimulus)]
+            categories = list(self.categories)
+        if not chunks:
+            chunks = [([array(typecode) for _, typecode in self.schema], array('h'))]
+        return self._chunk_frame(chunks[0], categories)
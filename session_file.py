@@ -0,0 +1,196 @@
+import json
+import struct
+
+import numpy as np
+import pandas as pd
+
+# Layout: MAGIC, u32 header length, JSON header, zero padding, then every column
+# as one contiguous little-endian array starting at an ALIGNMENT boundary.
+# Text columns are stored as integer codes with their categories in the header.
+# The header indexes every contiguous run of a stimulus (a segment) by row
+# range and time range, so one stimulus can be read without touching the rest.
+MAGIC = b'GZSESS01'
+ALIGNMENT = 64
+EXTENSION = 'gzs'
+
+# (stimulus column, time column) of the known CSV layouts
+LAYOUTS = (
+    ('stimulus', 'system_time_now'),  # gp_tb.py
+    ('Event Flag', 'Timestamp'),      # more_stimuli.py
+)
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _segments(codes, categories, times):
+    """Row and time range of every run of equal stimulus codes."""
+    if not len(codes):
+        return []
+    starts = np.flatnonzero(np.concatenate([[True], codes[1:] != codes[:-1]]))
+    stops = np.append(starts[1:], len(codes))
+    segments = []
+    for start, stop in zip(starts.tolist(), stops.tolist()):
+        segment = {'stimulus': categories[codes[start]], 'start': start, 'stop': stop}
+        if times is not None:
+            segment['t_start'] = float(np.nanmin(times[start:stop]))
+            segment['t_end'] = float(np.nanmax(times[start:stop]))
+        segments.append(segment)
+    return segments
+
+
+def write_session(frame, path, stimulus_column=None, time_column=None):
+    """Write a DataFrame as an indexed session file; returns the header."""
+    if stimulus_column is None:
+        for stimulus_column, layout_time in LAYOUTS:
+            if stimulus_column in frame:
+                time_column = time_column or layout_time
+                break
+        else:
+            raise ValueError("no stimulus column found; pass stimulus_column")
+    if time_column is not None and time_column not in frame:
+        time_column = None
+
+    arrays = {}
+    columns = []
+    for name in frame.columns:
+        series = frame[name]
+        entry = {'name': name}
+        if pd.api.types.is_numeric_dtype(series) and not isinstance(series.dtype, pd.CategoricalDtype):
+            values = series.to_numpy()
+        else:
+            codes, categories = pd.factorize(series.astype(str), sort=False)
+            values = codes.astype(np.int32 if len(categories) > 32767 else np.int16)
+            entry['categories'] = [str(c) for c in categories]
+        values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder('<'))
+        entry['dtype'] = values.dtype.str
+        arrays[name] = values
+        columns.append(entry)
+
+    stimulus_entry = next(c for c in columns if c['name'] == stimulus_column)
+    times = arrays[time_column].astype(float) if time_column else None
+    header = {
+        'rows': len(frame),
+        'stimulus_column': stimulus_column,
+        'time_column': time_column,
+        'segments': _segments(arrays[stimulus_column], stimulus_entry['categories'], times),
+        'columns': columns,
+    }
+
+    # Offsets depend on the header size, which depends on the offsets
+    data_start = _align(len(MAGIC) + 4 + len(json.dumps(header).encode()))
+    while True:
+        offset = data_start
+        for entry in columns:
+            entry['offset'] = offset
+            offset = _align(offset + arrays[entry['name']].nbytes)
+        encoded = json.dumps(header).encode()
+        if len(MAGIC) + 4 + len(encoded) <= data_start:
+            break
+        data_start = _align(len(MAGIC) + 4 + len(encoded))
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(encoded)) + encoded)
+        for entry in columns:
+            f.write(b'\0' * (entry['offset'] - f.tell()))
+            f.write(arrays[entry['name']].tobytes())
+    return header
+
+
+class SessionFile:
+    """Memory-mapped read access to a session file.
+
+    Columns are np.memmap views, so reading one stimulus only pages in the
+    bytes of its segments.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a session file")
+            (length,) = struct.unpack('<I', f.read(4))
+            self.header = json.loads(f.read(length))
+        self.rows = self.header['rows']
+        self.segments = self.header['segments']
+        self._columns = {entry['name']: entry for entry in self.header['columns']}
+        self._maps = {}
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    @property
+    def stimuli(self):
+        return list(dict.fromkeys(segment['stimulus'] for segment in self.segments))
+
+    def raw(self, name):
+        """Zero-copy memmap of a column (codes for text columns)."""
+        if name not in self._maps:
+            entry = self._columns[name]
+            if self.rows:
+                self._maps[name] = np.memmap(self.path, dtype=np.dtype(entry['dtype']), mode='r',
+                                             offset=entry['offset'], shape=(self.rows,))
+            else:
+                self._maps[name] = np.empty(0, dtype=np.dtype(entry['dtype']))
+        return self._maps[name]
+
+    def _frame(self, rows, names=None):
+        data = {}
+        for name in names or self.columns:
+            values = self.raw(name)[rows]
+            entry = self._columns[name]
+            if 'categories' in entry:
+                values = pd.Categorical.from_codes(values, entry['categories'])
+            data[name] = values
+        return pd.DataFrame(data, copy=False)
+
+    def frame(self, columns=None):
+        return self._frame(slice(None), columns)
+
+    def stimulus_segments(self, stimulus):
+        return [segment for segment in self.segments if segment['stimulus'] == stimulus]
+
+    def stimulus_frame(self, stimulus, columns=None):
+        """Samples recorded while stimulus was shown.
+
+        A stimulus shown once is a zero-copy slice; repeated presentations
+        are concatenated.
+        """
+        frames = [self._frame(slice(segment['start'], segment['stop']), columns)
+                  for segment in self.stimulus_segments(stimulus)]
+        if not frames:
+            return self._frame(slice(0, 0), columns)
+        if len(frames) == 1:
+            return frames[0]
+        return pd.concat(frames, ignore_index=True)
+
+    def to_csv(self, path):
+        frame = self.frame()
+        for name, entry in self._columns.items():
+            if 'categories' in entry:
+                frame[name] = frame[name].astype(str)
+        frame.to_csv(path, index=False)
+
+
+def convert_csv(csv_path, session_path=None):
+    """Convert a CSV recording to a session file next to it."""
+    if session_path is None:
+        session_path = f"{csv_path.rsplit('.', 1)[0]}.{EXTENSION}"
+    write_session(pd.read_csv(csv_path), session_path)
+    return session_path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert between CSV recordings and indexed session files")
+    parser.add_argument('source')
+    parser.add_argument('target', nargs='?')
+    args = parser.parse_args()
+
+    if args.source.endswith(f'.{EXTENSION}'):
+        SessionFile(args.source).to_csv(args.target or f"{args.source.rsplit('.', 1)[0]}.csv")
+    else:
+        print(f"✅ Saved {convert_csv(args.source, args.target)}")
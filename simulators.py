@@ -0,0 +1,330 @@
+import math
+import random
+import re
+import select
+import socket
+import threading
+import time
+
+GAZE_DATA = 'gaze_data'  # same value as tobii_research.EYETRACKER_GAZE_DATA
+
+_SET_RE = re.compile(rb'<SET ID="([A-Z_]+)"(?: STATE="(\d+)")?(?: VALUE="([^"]*)")?\s*/>')
+
+
+class _GazePath:
+    """Plausible gaze: fixations with small noise, separated by saccades."""
+
+    def __init__(self, rng, rate_hz):
+        self.rng = rng
+        self.rate_hz = rate_hz
+        self.x = self.y = 0.5
+        self._remaining = 0
+
+    def next(self):
+        rng = self.rng
+        if self._remaining <= 0:
+            # New fixation of 150-500 ms somewhere on the screen
+            self.x = rng.uniform(0.1, 0.9)
+            self.y = rng.uniform(0.1, 0.9)
+            self._remaining = int(rng.uniform(0.15, 0.5) * self.rate_hz) + 1
+        self._remaining -= 1
+        return self.x + rng.gauss(0, 0.003), self.y + rng.gauss(0, 0.003)
+
+
+class GazepointSimulator(threading.Thread):
+    """Local stand-in for the Gazepoint Open Gaze API server.
+
+    Accepts one client, answers <SET .../> commands with <ACK .../> and,
+    once ENABLE_SEND_DATA is on, streams <REC .../> records at rate_hz.
+    fragment splits the byte stream into random sends of at most that many
+    bytes, jitter_ms delays each send by up to that much, and malformed_rate
+    is the fraction of records that are cut short.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, rate_hz=150, fragment=None,
+                 jitter_ms=0.0, malformed_rate=0.0, seed=None):
+        super().__init__(daemon=True)
+        self.rate_hz = rate_hz
+        self.fragment = fragment
+        self.jitter_ms = jitter_ms
+        self.malformed_rate = malformed_rate
+        self.sent = 0
+        self.malformed = 0
+        self.events = []
+        self._rng = random.Random(seed)
+        self._path = _GazePath(self._rng, rate_hz)
+        self._server = socket.create_server((host, port))
+        self._server.settimeout(0.1)
+        self.address = self._server.getsockname()[:2]
+        self._stop_event = threading.Event()
+
+    def _record(self, index):
+        x, y = self._path.next()
+        t = index / self.rate_hz
+        rx, ry = x + self._rng.gauss(0, 0.002), y + self._rng.gauss(0, 0.002)
+        record = (f'<REC TIME="{t:.5f}" FPOGX="{(x + rx) / 2:.5f}" FPOGY="{(y + ry) / 2:.5f}" '
+                  f'FPOGS="{t:.5f}" FPOGD="0.10000" FPOGID="{index}" FPOGV="1" '
+                  f'LPOGX="{x:.5f}" LPOGY="{y:.5f}" LPOGV="1" '
+                  f'RPOGX="{rx:.5f}" RPOGY="{ry:.5f}" RPOGV="1" '
+                  f'LPCX="0.41000" LPCY="0.52000" LPD="21.50000" LPS="1.00000" LPV="1" '
+                  f'RPCX="0.59000" RPCY="0.52000" RPD="21.30000" RPS="1.00000" RPV="1" '
+                  f'LPUPILD="0.00{self._rng.randint(300, 420)}" LPUPILDV="1" '
+                  f'RPUPILD="0.00{self._rng.randint(300, 420)}" RPUPILDV="1" />')
+        if self.malformed_rate and self._rng.random() < self.malformed_rate:
+            self.malformed += 1
+            record = record[:self._rng.randint(5, len(record) - 3)]
+        return record + '\r\n'
+
+    def _send(self, conn, payload):
+        if self.jitter_ms:
+            time.sleep(self._rng.uniform(0, self.jitter_ms) / 1000.0)
+        if not self.fragment:
+            conn.sendall(payload)
+            return
+        pos = 0
+        while pos < len(payload):
+            size = self._rng.randint(1, self.fragment)
+            conn.sendall(payload[pos:pos + size])
+            pos += size
+
+    def _handle_commands(self, conn, pending, enabled):
+        for match in _SET_RE.finditer(pending):
+            name, state, value = match.groups()
+            if name == b'ENABLE_SEND_DATA':
+                enabled = state == b'1'
+            elif name == b'USER_EVENT':
+                self.events.append((self.sent, (value or b'').decode()))
+            ack = b'<ACK ID="' + name + b'"'
+            if state is not None:
+                ack += b' STATE="' + state + b'"'
+            if value is not None:
+                ack += b' VALUE="' + value + b'"'
+            self._send(conn, ack + b' />\r\n')
+        return enabled
+
+    def run(self):
+        conn = None
+        while conn is None and not self._stop_event.is_set():
+            try:
+                conn, _ = self._server.accept()
+            except socket.timeout:
+                continue
+        if conn is None:
+            self._server.close()
+            return
+
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        pending = b''
+        enabled = False
+        start = None
+        try:
+            while not self._stop_event.is_set():
+                readable, _, _ = select.select([conn], [], [], min(0.005, 1.0 / self.rate_hz))
+                if readable:
+                    data = conn.recv(4096)
+                    if not data:
+                        break
+                    pending += data
+                    cut = pending.rfind(b'\r\n')
+                    if cut >= 0:
+                        was_enabled = enabled
+                        enabled = self._handle_commands(conn, pending[:cut], enabled)
+                        pending = pending[cut + 2:]
+                        if enabled and not was_enabled:
+                            start = time.perf_counter() - self.sent / self.rate_hz
+                if enabled:
+                    due = int((time.perf_counter() - start) * self.rate_hz)
+                    if due > self.sent:
+                        batch = ''.join(self._record(i) for i in range(self.sent, due))
+                        self._send(conn, batch.encode())
+                        self.sent = due
+        except OSError:
+            pass
+        finally:
+            conn.close()
+            self._server.close()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+
+
+class FakeEyeTracker:
+    """Stand-in for a tobii_research EyeTracker.
+
+    subscribe_to(GAZE_DATA, callback, as_dictionary=True) starts a thread that
+    calls callback with SDK-shaped gaze dictionaries at rate_hz. The tracker
+    keeps the total time spent inside the callback and how far delivery fell
+    behind schedule, which is what limits the sustainable sample rate.
+    """
+
+    def __init__(self, rate_hz=600, model='Fake Tobii', seed=None, invalid_rate=0.02):
+        self.model = model
+        self.address = 'tobii-prp://fake'
+        self.serial_number = 'FAKE-0000'
+        self.device_name = model
+        self.rate_hz = rate_hz
+        self.invalid_rate = invalid_rate
+        self.delivered = 0
+        self.callback_ns = 0
+        self.max_lag = 0.0
+        self._rng = random.Random(seed)
+        self._path = _GazePath(self._rng, rate_hz)
+        self._threads = {}
+
+    def _sample(self, index, start_us):
+        rng = self._rng
+        device_us = int(index * 1e6 / self.rate_hz)
+        sample = {'device_time_stamp': device_us, 'system_time_stamp': start_us + device_us}
+        x, y = self._path.next()
+        for eye, dx in (('left', -0.002), ('right', 0.002)):
+            valid = rng.random() >= self.invalid_rate
+            if valid:
+                point = (x + dx + rng.gauss(0, 0.002), y + rng.gauss(0, 0.002))
+                pupil = rng.uniform(3.0, 4.2)
+            else:
+                point = (math.nan, math.nan)
+                pupil = math.nan
+            origin_x = -30.0 if eye == 'left' else 30.0
+            sample.update({
+                f'{eye}_gaze_point_on_display_area': point,
+                f'{eye}_gaze_point_in_user_coordinate_system': (point[0] * 500 - 250, 300 - point[1] * 300, 50.0),
+                f'{eye}_gaze_point_validity': int(valid),
+                f'{eye}_pupil_diameter': pupil,
+                f'{eye}_pupil_validity': int(valid),
+                f'{eye}_gaze_origin_in_user_coordinate_system': (origin_x, 10.0, 600.0),
+                f'{eye}_gaze_origin_in_trackbox_coordinate_system': (0.5 + origin_x / 300, 0.5, 0.5),
+                f'{eye}_gaze_origin_validity': int(valid),
+            })
+        return sample
+
+    def _deliver(self, callback, stop_event):
+        start = time.perf_counter()
+        start_us = time.monotonic_ns() // 1000
+        index = 0
+        while not stop_event.is_set():
+            due = int((time.perf_counter() - start) * self.rate_hz)
+            if due <= index:
+                time.sleep(min(0.001, 1.0 / self.rate_hz))
+                continue
+            self.max_lag = max(self.max_lag, (due - index - 1) / self.rate_hz)
+            for i in range(index, due):
+                sample = self._sample(i, start_us)
+                t0 = time.perf_counter_ns()
+                callback(sample)
+                self.callback_ns += time.perf_counter_ns() - t0
+                self.delivered += 1
+            index = due
+
+    def get_gaze_output_frequency(self):
+        return float(self.rate_hz)
+
+    def subscribe_to(self, stream, callback, as_dictionary=True):
+        if stream != GAZE_DATA:
+            raise ValueError(f"FakeEyeTracker only provides {GAZE_DATA!r}")
+        stop_event = threading.Event()
+        thread = threading.Thread(target=self._deliver, args=(callback, stop_event), daemon=True)
+        self._threads[callback] = (thread, stop_event)
+        thread.start()
+
+    def unsubscribe_from(self, stream, callback=None):
+        callbacks = [callback] if callback is not None else list(self._threads)
+        for cb in callbacks:
+            thread, stop_event = self._threads.pop(cb)
+            stop_event.set()
+            thread.join()
+
+
+def measure_gazepoint(rate_hz=150, duration=5.0, **simulator_options):
+    """Run GazepointStream against the simulator and report throughput.
+
+    The reader mirrors gazepoint_collection in gp_tb.py: parse, stamp and
+    append to a SampleStore.
+    """
+    from acquisition import HostClock
+    from gazepoint_stream import GazepointStream
+    from sample_store import SampleStore, GAZEPOINT_SCHEMA
+
+    simulator = GazepointSimulator(rate_hz=rate_hz, **simulator_options)
+    simulator.start()
+    sock = socket.create_connection(simulator.address)
+    sock.send(b'<SET ID="ENABLE_SEND_DATA" STATE="1" />\r\n')
+    sock.settimeout(0.1)
+
+    clock = HostClock()
+    store = SampleStore(GAZEPOINT_SCHEMA)
+    stream = GazepointStream(sock)
+    stop_at = time.perf_counter() + duration
+    cpu_start = time.thread_time()
+    stopped = False
+    while True:
+        if not stopped and time.perf_counter() >= stop_at:
+            simulator.stop()
+            stopped = True
+        try:
+            samples = stream.read()
+        except socket.timeout:
+            continue
+        except OSError:
+            break
+        stamp = clock.now()
+        host = (clock.to_epoch_ms(stamp), stamp)
+        for sample in samples:
+            store.append(host + sample, 'none')
+    cpu = time.thread_time() - cpu_start
+    sock.close()
+
+    expected = simulator.sent - simulator.malformed
+    return {
+        'sent': simulator.sent,
+        'received': len(store),
+        'malformed_detected': stream.malformed,
+        'drop_rate': 1.0 - len(store) / expected if expected else 0.0,
+        'sample_rate_hz': len(store) / duration,
+        'cpu_us_per_sample': cpu * 1e6 / len(store) if len(store) else math.nan,
+    }
+
+
+def measure_tobii(callback, rate_hz=600, duration=5.0):
+    """Drive callback from a FakeEyeTracker and report delivery statistics."""
+    tracker = FakeEyeTracker(rate_hz=rate_hz)
+    tracker.subscribe_to(GAZE_DATA, callback, as_dictionary=True)
+    time.sleep(duration)
+    tracker.unsubscribe_from(GAZE_DATA, callback)
+    return {
+        'delivered': tracker.delivered,
+        'sample_rate_hz': tracker.delivered / duration,
+        'callback_us_per_sample': tracker.callback_ns / 1e3 / tracker.delivered if tracker.delivered else math.nan,
+        'max_lag_ms': tracker.max_lag * 1e3,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from acquisition import HostClock, SampleQueue, QueueConsumer
+    from tobii_convert import gaze_sample as tobii_sample
+
+    parser = argparse.ArgumentParser(description="Benchmark the acquisition path without eye trackers")
+    parser.add_argument('--gazepoint-hz', type=float, default=150)
+    parser.add_argument('--tobii-hz', type=float, default=600)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--fragment', type=int, default=None)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--malformed-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    print("Gazepoint:", measure_gazepoint(args.gazepoint_hz, args.duration, fragment=args.fragment,
+                                          jitter_ms=args.jitter_ms, malformed_rate=args.malformed_rate))
+
+    # Same hand-off as tobii_gaze_callback in gp_tb.py (convert in the callback, then enqueue)
+    clock = HostClock()
+    queue = SampleQueue()
+    consumer = QueueConsumer(queue, lambda items: None)
+    consumer.start()
+    result = measure_tobii(lambda gaze_data: queue.push((clock.now(), tobii_sample(gaze_data), 'none')),
+                           args.tobii_hz, args.duration)
+    consumer.close()
+    result['queue_dropped'] = queue.dropped
+    print("Tobii:", result)
@@ -0,0 +1,145 @@
+import csv
+import threading
+import time
+
+import numpy as np
+from psychopy import visual, event
+
+IMAGE_SIZE = (800, 600)
+DEFAULT_FRAME_RATE = 60.0
+
+
+class StimulusManager:
+    """Preloaded stimuli presented for an exact number of frames.
+
+    All ImageStim/TextStim objects are created (and their textures uploaded)
+    before the session, so nothing is decoded when a stimulus appears. Every
+    onset and offset is stamped in a win.callOnFlip callback, right after the
+    flip that made it visible, with the same perf_counter_ns clock the gaze
+    samples use. on_onset(name, flip_ns) runs at that moment too, which is
+    where the experiment sends USER_EVENT. labels() assigns samples to
+    stimuli from these stamps.
+
+    stimuli are dicts like {"type": "image", "content": "face.jpg", "name": "Image_1"};
+    a plain string is an image whose name is its file name.
+    """
+
+    def __init__(self, win, stimuli, on_onset=None, now=time.perf_counter_ns, frame_rate=None):
+        self.win = win
+        self.on_onset = on_onset
+        self.now = now
+        self.frame_rate = frame_rate or win.getActualFrameRate() or DEFAULT_FRAME_RATE
+        self.log = []  # [name, onset_ns, offset_ns, frames]
+        self._log_lock = threading.Lock()
+        self._stims = {}
+        for spec in stimuli:
+            if isinstance(spec, str):
+                spec = {"type": "image", "content": spec, "name": spec}
+            self._stims[spec["name"]] = self._create(spec)
+        self._visible = None
+
+    def _create(self, spec):
+        if spec["type"] == "text":
+            return visual.TextStim(self.win, text=spec["content"], color="black", pos=(0, 0), height=40)
+        if spec["type"] == "image":
+            return visual.ImageStim(self.win, image=spec["content"], pos=(0, 0), size=IMAGE_SIZE)
+        raise ValueError(f"unknown stimulus type {spec['type']!r}")
+
+    def _mark_onset(self, name):
+        # Stamp and log under the lock, so labels() never sees a stamp
+        # without the entry it belongs to
+        with self._log_lock:
+            flip_ns = self.now()
+            self._end_visible(flip_ns)
+            self.log.append([name, flip_ns, None, 0])
+            self._visible = self.log[-1]
+        if self.on_onset is not None:
+            self.on_onset(name, flip_ns)
+
+    def _mark_offset(self):
+        with self._log_lock:
+            self._end_visible(self.now())
+
+    def _end_visible(self, flip_ns):
+        if self._visible is not None:
+            self._visible[2] = flip_ns
+            self._visible = None
+
+    def frames_for(self, duration):
+        return max(1, int(round(duration * self.frame_rate)))
+
+    def _show_frames(self, name, frames, keys):
+        stim = self._stims[name]
+        event.clearEvents()
+        for frame in range(frames):
+            stim.draw()
+            if frame == 0:
+                self.win.callOnFlip(self._mark_onset, name)
+            self.win.flip()
+            self._visible[3] += 1
+            if keys and event.getKeys(keys):
+                return False
+        return True
+
+    def present(self, name, duration, abort_keys=('escape',)):
+        """Show a stimulus for round(duration * frame rate) frames.
+
+        Returns False if one of abort_keys was pressed.
+        """
+        return self._show_frames(name, self.frames_for(duration), list(abort_keys))
+
+    def present_until_key(self, name, keys=('space',)):
+        """Show a stimulus, redrawing every frame until one of keys is pressed."""
+        stim = self._stims[name]
+        event.clearEvents()
+        stim.draw()
+        self.win.callOnFlip(self._mark_onset, name)
+        self.win.flip()
+        while True:
+            self._visible[3] += 1
+            pressed = event.getKeys(list(keys))
+            if pressed:
+                return pressed[0]
+            stim.draw()
+            self.win.flip()
+
+    def clear(self):
+        """Flip to an empty screen and stamp the offset of the visible stimulus."""
+        self.win.callOnFlip(self._mark_offset)
+        self.win.flip()
+
+    def labels(self, host_ns):
+        """Stimulus on screen at each perf_counter_ns stamp, as a Categorical.
+
+        A sample belongs to a stimulus if it was stamped at or after the flip
+        that showed it and before the flip that removed it; other samples are
+        'none'. Stamps must not be newer than the call, which holds for
+        samples already in a store: a presentation whose flip comes later
+        cannot change their label.
+        """
+        import pandas as pd
+
+        with self._log_lock:
+            log = [(name, onset, offset) for name, onset, offset, _ in self.log]
+        categories = ['none'] + list(self._stims)
+        host_ns = np.asarray(host_ns, dtype=np.int64)
+        codes = np.zeros(len(host_ns), dtype=np.int16)
+        if log:
+            onsets = np.array([onset for _, onset, _ in log], dtype=np.int64)
+            offsets = np.array([np.iinfo(np.int64).max if offset is None else offset for _, _, offset in log],
+                               dtype=np.int64)
+            stimulus_codes = np.array([categories.index(name) for name, _, _ in log], dtype=np.int16)
+            entry = np.searchsorted(onsets, host_ns, side='right') - 1
+            shown = (entry >= 0) & (host_ns < offsets[np.maximum(entry, 0)])
+            codes[shown] = stimulus_codes[entry[shown]]
+        return pd.Categorical.from_codes(codes, categories)
+
+    def write_log(self, path, to_epoch_ms=None):
+        """Save onsets/offsets (ns, and epoch ms if a converter is given) as CSV."""
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['stimulus', 'onset_ns', 'offset_ns', 'frames', 'onset_ms', 'offset_ms'])
+            for name, onset, offset, frames in self.log:
+                onset_ms = to_epoch_ms(onset) if to_epoch_ms else ''
+                offset_ms = to_epoch_ms(offset) if to_epoch_ms and offset is not None else ''
+                writer.writerow([name, onset, offset if offset is not None else '', frames, onset_ms, offset_ms])
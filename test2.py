@@ -1,6 +1,6 @@
 import tobii_research as tr
-import csv
 from datetime import datetime, timedelta
+from tobii_export import export_gaze_with_openness
 
 
 
@@ -41,44 +41,9 @@ if eyetrackers:
     # Nome del file CSV
     filename = "eye_tracking_final.csv"
 
-    # Determina i campi dal primo dato di all_gaze_data
+    # Allinea openness e sguardo per timestamp e scrivi su CSV
     if all_gaze_data:
-        fieldnames = []
-
-        # Ottieni tutte le chiavi del primo elemento (anche nested)
-        first_data = all_gaze_data[0]
-        for key in first_data.keys():
-            if isinstance(first_data[key], dict):  # Se è un dizionario (es. left_eye, right_eye)
-                for subkey in first_data[key].keys():
-                    fieldnames.append(f"{key}.{subkey}")
-            else:
-                fieldnames.append(key)
-
-        # Aggiungi le due colonne di openness
-        fieldnames.append("left_eye_openness_value")
-        fieldnames.append("right_eye_openness_value")
-
-        # Scrivi su CSV
-        with open(filename, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(fieldnames)  # Scrive l'intestazione
-
-            # Scrive i dati riga per riga
-            for i in range(len(all_gaze_data)):  
-                row = []
-                data_point = all_gaze_data[i]
-                openness_point = openness_data[i] if i < len(openness_data) else {"left_eye_openness_value": "", "right_eye_openness_value": ""}
-
-                for field in fieldnames:
-                    if field in ["left_eye_openness_value", "right_eye_openness_value"]:
-                        row.append(openness_point.get(field, ""))  # Prendi il valore o "" se non c'è
-                    elif '.' in field:
-                        main_key, sub_key = field.split('.')
-                        row.append(data_point[main_key][sub_key])  # Prendi il valore annidato
-                    else:
-                        row.append(data_point[field])  # Prendi il valore normale
-                
-                writer.writerow(row)
+        export_gaze_with_openness(all_gaze_data, openness_data, filename)
 
         print(f"Dati salvati in: {filename}")
         print(f"Totale punti dati raccolti: {len(all_gaze_data)}")
@@ -0,0 +1,39 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from aoi import aoi_statistics, load_aois
+from heatmaps import IMAGE_HEIGHT, IMAGE_WIDTH, IMAGE_X, IMAGE_Y, SCREEN_HEIGHT, SCREEN_WIDTH, screen_to_image
+
+
+def display_point(x, y):
+    """Normalised display coordinates (origin top-left) of a pixel in image-editor coordinates."""
+    return (x + IMAGE_X) / SCREEN_WIDTH, 1 - (IMAGE_Y + IMAGE_HEIGHT - y) / SCREEN_HEIGHT
+
+
+def test_aois_use_image_editor_orientation(tmp_path):
+    # Off-centre AOIs near the top-left of the image, as an image editor reports them
+    path = tmp_path / 'aois.json'
+    path.write_text(json.dumps({'face.jpg': [
+        {'name': 'eyes', 'rect': [100, 50, 200, 100]},
+        {'name': 'mouth', 'polygon': [[500, 60], [700, 60], [600, 180]]},
+    ]}))
+    aois = load_aois(str(path))['face.jpg']
+
+    # The same pixels and their vertical mirror images, via the fixations' conversion
+    x, y = display_point(np.array([200, 200, 600, 600]), np.array([100, IMAGE_HEIGHT - 100, 100, IMAGE_HEIGHT - 100]))
+    assert (y[[0, 2]] < 0.5).all()  # the upper part of the screen
+    image_x, image_y = screen_to_image(x, y)
+    assert aois.primary_aoi(image_x, image_y).tolist() == [0, -1, 1, -1]
+
+    fixations = pd.DataFrame({'stimulus': 'face.jpg', 'start_time': [0.0, 1.0], 'end_time': [0.5, 1.5],
+                              'x': image_x[:2], 'y': image_y[:2]})
+    stats, _ = aoi_statistics(fixations, {'face.jpg': aois})
+    assert stats['aoi'].tolist() == ['eyes']
+    assert stats['dwell_time'].tolist() == [0.5]
+
+
+def test_display_point_round_trips():
+    image_x, image_y = screen_to_image(*display_point(np.array([0.0, IMAGE_WIDTH]), np.array([0.0, IMAGE_HEIGHT])))
+    assert np.allclose(image_x, [0, IMAGE_WIDTH]) and np.allclose(image_y, [IMAGE_HEIGHT, 0])
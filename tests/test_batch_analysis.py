@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+import batch_analysis
+from batch_analysis import analyse_session, idt_window_size, is_up_to_date, load_session
+
+
+def write_session(path, rate_hz, time_scale, n=600):
+    # gp_tb.py layout; device_time_stamp is seconds for Gazepoint, microseconds for Tobii
+    rng = np.random.default_rng(0)
+    x = np.repeat(rng.uniform(0.2, 0.8, size=n // 60 + 1), 60)[:n] + rng.normal(0, 0.002, size=n)
+    y = np.repeat(rng.uniform(0.2, 0.8, size=n // 60 + 1), 60)[:n] + rng.normal(0, 0.002, size=n)
+    pd.DataFrame({
+        'system_time_now': np.arange(n), 'device_time_stamp': np.arange(n) / rate_hz * time_scale,
+        'left_gaze_x': x, 'left_gaze_y': y, 'left_pupil': 3.0, 'left_validity': 1,
+        'right_gaze_x': x, 'right_gaze_y': y, 'right_pupil': 3.0, 'right_validity': 1,
+        'stimulus': 'face.jpg',
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+def test_idt_window_is_the_same_duration_on_every_device(tmp_path):
+    gazepoint = load_session(write_session(tmp_path / 'gazepoint_data_1.csv', 150, 1.0))
+    tobii = load_session(write_session(tmp_path / 'tobii_data_1.csv', 600, 1e6))
+    assert idt_window_size(gazepoint) == round(batch_analysis.WINDOW_MS * 150 / 1000)
+    assert idt_window_size(tobii) == round(batch_analysis.WINDOW_MS * 600 / 1000)
+    # more_stimuli.py sessions have no time column
+    assert idt_window_size(gazepoint.assign(time=np.nan)) == batch_analysis.WINDOW_SIZE
+
+
+def test_changing_the_window_invalidates_summaries(tmp_path, monkeypatch):
+    path = write_session(tmp_path / 'gazepoint_data_1.csv', 150, 1.0)
+    output = tmp_path / 'analysis'
+    analyse_session(path, str(output))
+    assert is_up_to_date(path, str(output))
+    monkeypatch.setattr(batch_analysis, 'WINDOW_MS', 150.0)
+    assert not is_up_to_date(path, str(output))
@@ -0,0 +1,85 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fixations import OnlineFixationDetector, classify_idt
+
+RATE_HZ = 600
+FIXATION_S = 0.3
+SACCADE_S = 0.03
+
+
+def noisy_fixations(noise, count=8, seed=0):
+    """Fixations of FIXATION_S on distinct targets joined by linear saccades, with Gaussian noise."""
+    rng = np.random.default_rng(seed)
+    targets = [rng.uniform(0.1, 0.9, 2)]
+    while len(targets) < count:
+        target = rng.uniform(0.1, 0.9, 2)
+        if np.hypot(*(target - targets[-1])) > 0.2:
+            targets.append(target)
+    points = []
+    steps = int(SACCADE_S * RATE_HZ)
+    for i, target in enumerate(targets):
+        points.append(np.repeat(target[None], int(FIXATION_S * RATE_HZ), axis=0))
+        if i + 1 < count:
+            fraction = (np.arange(steps) + 1)[:, None] / (steps + 1)
+            points.append(target + (targets[i + 1] - target) * fraction)
+    xy = np.concatenate(points) + rng.normal(0, noise, size=(sum(map(len, points)), 2))
+    return np.arange(len(xy)) / RATE_HZ, xy, np.array(targets)
+
+
+@pytest.mark.parametrize('noise', [0.0005, 0.001, 0.002])
+def test_ivt_finds_every_fixation_in_noisy_data(noise):
+    t, xy, targets = noisy_fixations(noise)
+    detector = OnlineFixationDetector(mode='ivt')
+    events = [detector.update(time, x, y) for time, (x, y) in zip(t, xy)]
+    events.append(detector.update(t[-1] + 1 / RATE_HZ, math.nan, math.nan))  # tracking loss ends the last one
+    ends = [event for event in events if event is not None and event.kind == 'end']
+
+    assert len(ends) == len(targets)
+    durations = np.array([event.end_time - event.start_time for event in ends])
+    assert np.all(np.abs(durations - FIXATION_S) < 0.02)
+    centres = np.array([(event.x, event.y) for event in ends])
+    assert np.all(np.hypot(*(centres - targets).T) < 0.01)
+
+
+def idt_loop(x, y, dispersion_threshold, window_size):
+    # The pandas loop more_stimuli.py ran before classify_idt, verbatim apart from names
+    df = pd.DataFrame({'x_avg': x, 'y_avg': y})
+    df['Movement'] = 'saccade'
+    for i in range(len(df) - window_size):
+        window_x = df['x_avg'].iloc[i : i + window_size]
+        window_y = df['y_avg'].iloc[i : i + window_size]
+        dispersion = (window_x.max() - window_x.min()) + (window_y.max() - window_y.min())
+        if dispersion < dispersion_threshold:
+            df.loc[i : i + window_size, 'Movement'] = 'fixation'
+    return df['Movement'].to_numpy()
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_idt_matches_the_loop_it_replaced(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 400))
+    window_size = int(rng.integers(1, 50))
+    # Random walks with jumps, so both labels occur, and NaN samples and blocks
+    steps = rng.normal(0, 0.004, size=(n, 2)) + (rng.random((n, 1)) < 0.02) * rng.normal(0, 0.3, size=(n, 2))
+    x, y = np.cumsum(steps, axis=0).T
+    x[rng.random(n) < 0.05] = np.nan
+    y[rng.random(n) < 0.05] = np.nan
+    start = int(rng.integers(0, n))
+    x[start:start + int(rng.integers(0, 2 * window_size + 1))] = np.nan
+
+    labels = classify_idt(x, y, 0.05, window_size=window_size)
+    assert labels.tolist() == idt_loop(x, y, 0.05, window_size).tolist()
+
+
+def test_binocular_update_skips_eyes_flagged_invalid():
+    # Gazepoint reports an invalid eye with validity 0 and stale coordinates, not NaN
+    detector = OnlineFixationDetector(mode='idt', window_ms=50)
+    for i in range(60):
+        detector.update_binocular(i / 150, 0.3, 0.3, 0.9, 0.9, 1, 0)
+    assert detector.fixating and abs(detector.last_event.x - 0.3) < 1e-9
+    detector.update_binocular(1.0, 0.3, 0.3, 0.9, 0.9, 0, 0)
+    assert not detector.fixating
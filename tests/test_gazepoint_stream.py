@@ -0,0 +1,60 @@
+import random
+import xml.etree.ElementTree as ET
+
+from gazepoint_stream import GAZE_FIELDS, MAX_PENDING, GazepointStream
+
+# Attributes as the server writes them, many more than GAZE_FIELDS
+RECORD = ('<REC TIME="{t:.5f}" FPOGX="0.50000" FPOGY="0.50000" FPOGS="{t:.5f}" FPOGD="0.10000" '
+          'FPOGID="{i}" FPOGV="1" LPOGX="{x:.5f}" LPOGY="{y:.5f}" LPOGV="1" '
+          'RPOGX="{rx:.5f}" RPOGY="{ry:.5f}" RPOGV="{v}" LPCX="0.41000" LPCY="0.52000" LPD="21.50000" '
+          'LPS="1.00000" LPV="1" LPUPILD="{p:.5f}" LPUPILDV="1" RPUPILD="{rp:.5f}" RPUPILDV="1" />\r\n')
+
+
+def records(n, seed=0):
+    rng = random.Random(seed)
+    return ''.join(RECORD.format(t=i / 150, i=i, x=rng.random(), y=rng.random(), rx=rng.random(),
+                                 ry=rng.random(), v=rng.randint(0, 1), p=rng.uniform(0.003, 0.004),
+                                 rp=rng.uniform(0.003, 0.004))
+                   for i in range(n)).encode()
+
+
+def reference(data):
+    # The ElementTree parse gazepoint_collection used before GazepointStream
+    return [tuple(float(ET.fromstring(line).get(key.decode())) for _, key in GAZE_FIELDS)
+            for line in data.decode().strip().split('\r\n')]
+
+
+def test_fragmented_stream_matches_elementtree():
+    data = records(500)
+    rng = random.Random(1)
+    stream = GazepointStream()
+    samples = []
+    pos = 0
+    while pos < len(data):
+        size = rng.randint(1, 300)
+        samples += stream.feed(data[pos:pos + size])
+        pos += size
+    assert samples == reference(data)
+    assert stream.records == 500 and stream.malformed == 0
+
+
+def test_broken_records_are_counted_not_returned():
+    good = records(2)
+    truncated = records(1)[:120] + b'\r\n'
+    not_a_number = records(1).replace(b'LPOGY="', b'LPOGY="x')
+    ack = b'<ACK ID="ENABLE_SEND_DATA" STATE="1" />\r\n'
+    stream = GazepointStream()
+    samples = stream.feed(truncated + not_a_number + ack + good)
+    assert samples == reference(good)
+    assert stream.malformed == 2
+
+
+def test_carry_over_is_bounded_without_terminators():
+    stream = GazepointStream()
+    for _ in range(10):
+        assert stream.feed(b'<REC TIME="' + b'9' * (MAX_PENDING // 4)) == []
+        assert len(stream._pending) <= MAX_PENDING
+    assert stream.malformed > 0
+    # Parsing resumes with the first record after the next terminator
+    data = records(3)
+    assert stream.feed(b'"/>\r\n' + data) == reference(data)
@@ -0,0 +1,36 @@
+from metrics import RATE_ESTIMATE_INTERVALS, DeviceMetrics
+
+
+def feed(metrics, rate_hz, count, skip=()):
+    """count samples at rate_hz (device seconds), leaving out the indices in skip."""
+    for i in range(count):
+        if i not in skip:
+            metrics.update(i / rate_hz, int(i / rate_hz * 1e9))
+
+
+def test_gaps_are_counted_against_the_reported_rate():
+    metrics = DeviceMetrics('gazepoint', nominal_rate_hz=60)
+    feed(metrics, 60, 600, skip={100, 101, 102})
+    summary = metrics.summary()
+    assert summary['nominal_rate_hz'] == 60
+    assert summary['gaps'] == 1
+    assert summary['dropped'] == 3
+
+
+def test_rate_is_estimated_when_not_reported():
+    # A 60 Hz Gazepoint must not be judged against 150 Hz, nor a 250 Hz Tobii against 600 Hz
+    for name, rate_hz in (('gazepoint', 60), ('tobii', 250)):
+        metrics = DeviceMetrics(name, device_time_to_s=1.0)
+        feed(metrics, rate_hz, 1000, skip={10, 11, 500})
+        summary = metrics.summary()
+        assert abs(summary['nominal_rate_hz'] - rate_hz) < 1e-6
+        assert summary['gaps'] == 2  # the first one falls inside the estimation window
+        assert summary['dropped'] == 3
+
+
+def test_short_recording_estimates_from_what_there_is():
+    metrics = DeviceMetrics('tobii', device_time_to_s=1.0)
+    feed(metrics, 120, RATE_ESTIMATE_INTERVALS // 2)
+    summary = metrics.summary()
+    assert abs(summary['nominal_rate_hz'] - 120) < 1e-6
+    assert summary['gaps'] == 0
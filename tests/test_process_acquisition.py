@@ -0,0 +1,63 @@
+import time
+
+from acquisition import HostClock
+from process_acquisition import ProcessAcquisition
+from recording_writer import RecordingWriter, read_binary
+from sample_store import GAZEPOINT_SCHEMA, TOBII_SCHEMA, SampleStore
+from simulators import GazepointSimulator
+
+
+def test_samples_before_first_stimulus_are_labelled_none(tmp_path):
+    simulator = GazepointSimulator(rate_hz=150)
+    simulator.start()
+    stores = {'gazepoint': SampleStore(GAZEPOINT_SCHEMA), 'tobii': SampleStore(TOBII_SCHEMA)}
+    acquisition = ProcessAcquisition(stores, HostClock(), gazepoint=simulator.address,
+                                     fake_tobii_hz=600, capacity=4096)
+    writers = {name: RecordingWriter(store, tmp_path / f'{name}.gzc', 'binary', flush_interval=0.05)
+               for name, store in stores.items()}
+    try:
+        acquisition.connect()
+        acquisition.start()
+        for writer in writers.values():
+            writer.start()
+        # Let the writers flush samples that arrive before any stimulus is set
+        time.sleep(0.5)
+        acquisition.set_stimulus('face.jpg')
+        time.sleep(0.5)
+    finally:
+        acquisition.close()
+        simulator.stop()
+        rows = {name: writer.close() for name, writer in writers.items()}
+
+    for name, writer in writers.items():
+        assert writer.error is None
+        frame = read_binary(tmp_path / f'{name}.gzc')
+        assert len(frame) == rows[name] > 0
+        labels = frame['stimulus'].astype(str)
+        assert labels.iloc[0] == 'none'
+        assert labels.iloc[-1] == 'face.jpg'
+        # One switch from 'none' to 'face.jpg', never back
+        assert (labels != labels.shift()).sum() == 2
+
+
+def test_both_workers_publish_their_fixation_state():
+    simulator = GazepointSimulator(rate_hz=150)
+    simulator.start()
+    stores = {'gazepoint': SampleStore(GAZEPOINT_SCHEMA), 'tobii': SampleStore(TOBII_SCHEMA)}
+    acquisition = ProcessAcquisition(stores, HostClock(), gazepoint=simulator.address,
+                                     fake_tobii_hz=600, capacity=4096)
+    seen = set()
+    shown = False
+    try:
+        acquisition.connect()
+        acquisition.start()
+        deadline = time.monotonic() + 3.0
+        while (len(seen) < 2 or not shown) and time.monotonic() < deadline:
+            seen.update(name for name, tracker in acquisition.trackers.items() if tracker.fixating)
+            shown = shown or 'fixating' in acquisition.status()
+            time.sleep(0.01)
+    finally:
+        acquisition.close()
+        simulator.stop()
+    assert seen == {'gazepoint', 'tobii'}
+    assert shown
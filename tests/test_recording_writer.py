@@ -0,0 +1,27 @@
+import pandas as pd
+
+from batch_analysis import load_session
+from recording_writer import RecordingWriter
+from sample_store import GAZEPOINT_SCHEMA, SampleStore
+
+
+def test_csv_without_samples_has_a_header(tmp_path):
+    path = str(tmp_path / 'gazepoint_data_1.csv')
+    writer = RecordingWriter(SampleStore(GAZEPOINT_SCHEMA), path)
+    writer.start()
+    assert writer.close() == 0
+    assert pd.read_csv(path).columns.tolist() == [name for name, _ in GAZEPOINT_SCHEMA] + ['stimulus']
+    assert len(load_session(path)) == 0
+
+
+def test_csv_header_is_written_once(tmp_path):
+    path = str(tmp_path / 'gazepoint_data_1.csv')
+    store = SampleStore(GAZEPOINT_SCHEMA)
+    writer = RecordingWriter(store, path)
+    for i in range(3):
+        store.append((i, i) + (float(i),) * (len(GAZEPOINT_SCHEMA) - 2), 'face.jpg')
+        writer.flush()
+    assert writer.close() == 3
+    frame = pd.read_csv(path)
+    assert frame['system_time_now'].tolist() == [0, 1, 2]
+    assert (frame['stimulus'] == 'face.jpg').all()
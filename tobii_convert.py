@@ -0,0 +1,23 @@
+import math
+
+from sample_store import HOST_FIELDS, TOBII_SCHEMA
+
+# Columns of TOBII_SCHEMA after the ones the host clock provides
+COLUMNS = tuple(name for name, _ in TOBII_SCHEMA[HOST_FIELDS:])
+
+# Missing gaze and pupil values are NaN, not 0, so they cannot be mistaken for real data
+MISSING_POINT = (math.nan, math.nan)
+
+
+def gaze_sample(data):
+    """One SDK gaze dictionary as a tuple in COLUMNS order.
+
+    Cheap enough to run in the SDK callback, so the dictionary itself never
+    has to be kept.
+    """
+    get = data.get
+    left_x, left_y = get('left_gaze_point_on_display_area') or MISSING_POINT
+    right_x, right_y = get('right_gaze_point_on_display_area') or MISSING_POINT
+    return (get('device_time_stamp', 0),
+            left_x, left_y, get('left_pupil_diameter', math.nan), get('left_gaze_point_validity', 0),
+            right_x, right_y, get('right_pupil_diameter', math.nan), get('right_gaze_point_validity', 0))
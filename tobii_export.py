@@ -0,0 +1,77 @@
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+OPENNESS_FIELDS = ('left_eye_openness_value', 'right_eye_openness_value')
+
+
+def column_extractors(sample):
+    """(column name, extractor) pairs for the keys of one SDK dictionary.
+
+    Nested dictionaries become "key.subkey" columns; everything else,
+    including coordinate tuples, is kept as one column.
+    """
+    extractors = []
+    for key, value in sample.items():
+        if isinstance(value, dict):
+            for sub_key in value:
+                extractors.append((f"{key}.{sub_key}", lambda d, k=key, s=sub_key: d[k][s]))
+        else:
+            extractors.append((key, itemgetter(key)))
+    return extractors
+
+
+def to_columns(samples):
+    """Flatten a list of SDK dictionaries into a column-oriented DataFrame."""
+    if not samples:
+        return pd.DataFrame()
+    columns = {name: list(map(extract, samples)) for name, extract in column_extractors(samples[0])}
+    return pd.DataFrame(columns)
+
+
+def _default_tolerance(times):
+    intervals = np.diff(times)
+    intervals = intervals[intervals > 0]
+    return float(np.median(intervals)) / 2 if len(intervals) else 0
+
+
+def join_openness(gaze, openness, on='device_time_stamp', tolerance=None):
+    """Attach eye openness to every gaze row by nearest timestamp.
+
+    The two subscriptions deliver independently and may drop samples, so
+    rows are matched on `on` (device_time_stamp or system_time_stamp)
+    instead of by position. Gaze rows with no openness sample within
+    tolerance (default: half the median gaze interval) get NaN.
+    """
+    if gaze.empty:
+        return gaze
+    if openness.empty:
+        return gaze.assign(**{field: np.nan for field in OPENNESS_FIELDS})
+
+    order = None
+    if not gaze[on].is_monotonic_increasing:
+        order = np.argsort(gaze[on].to_numpy(), kind='stable')
+        gaze = gaze.iloc[order]
+    openness = openness[[on, *OPENNESS_FIELDS]]
+    if not openness[on].is_monotonic_increasing:
+        openness = openness.sort_values(on, kind='stable')
+    if tolerance is None:
+        tolerance = _default_tolerance(gaze[on].to_numpy())
+    if pd.api.types.is_integer_dtype(gaze[on]):
+        tolerance = int(tolerance)
+
+    merged = pd.merge_asof(gaze.reset_index(drop=True), openness, on=on,
+                           direction='nearest', tolerance=tolerance)
+    if order is not None:
+        merged = merged.iloc[np.argsort(order, kind='stable')].reset_index(drop=True)
+    return merged
+
+
+def export_gaze_with_openness(gaze_samples, openness_samples, filename, on='device_time_stamp', tolerance=None):
+    """Write gaze and openness dictionaries to one CSV; returns the row count."""
+    gaze = to_columns(gaze_samples)
+    openness = to_columns(openness_samples)
+    merged = join_openness(gaze, openness, on, tolerance)
+    merged.to_csv(filename, index=False)
+    return len(merged)